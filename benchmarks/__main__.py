@@ -0,0 +1,44 @@
+"""
+Run the benchmark suite and optionally compare against a previous run.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare results.json
+"""
+import argparse
+import sys
+
+# Importing the modules registers the benchmarks
+from benchmarks import bench_api, bench_pool, bench_search, bench_views, runner  # noqa: F401
+
+parser = argparse.ArgumentParser(prog="benchmarks", description=__doc__)
+parser.add_argument("-k", "--filter", default="*", help="only run benchmarks matching the glob")
+parser.add_argument("-r", "--repeat", type=int, default=5, help="timing repetitions (default: 5)")
+parser.add_argument("-q", "--quick", action="store_true", help="only run the smallest parameter")
+parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+parser.add_argument("-c", "--compare", help="compare against the results in this JSON file")
+
+
+def main():
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = runner.load(fp)
+
+    results = []
+    for result in runner.run(args.filter, args.repeat, args.quick):
+        results.append(result)
+        line = f"{runner.result_key(result):<40} {result['min'] * 1000:10.3f} ms"
+        previous = baseline.get(runner.result_key(result))
+        if previous:
+            line += f"  ({result['min'] / previous['min']:.2f}x)"
+        print(line, flush=True)
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            runner.dump(results, fp)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+from benchmarks.fixtures import FakeTildesClient, make_topic
+from benchmarks.runner import benchmark
+from squiggly.api import Client
+
+SIZES = (100, 1000, 10000)
+
+
+@benchmark("api.flatten_comment_tree", params=SIZES)
+def flatten_comment_tree(num_comments):
+    client = Client(tildes_client=FakeTildesClient())
+    topic = make_topic(num_comments)
+    return lambda: client._flatten_comment_tree(topic.comments)
+
+
+@benchmark("api.parse_topic", params=SIZES)
+def parse_topic(num_comments):
+    client = Client(tildes_client=FakeTildesClient())
+    topic = make_topic(num_comments)
+    return lambda: client._parse_topic(topic)
+
+
+@benchmark("api.list_topics", params=(5, 50, 500))
+def list_topics(per_page):
+    client = Client(tildes_client=FakeTildesClient(), per_page=per_page)
+    return lambda: client.list_topics("~test")
@@ -0,0 +1,50 @@
+"""
+Compare the memory used by the parsed records against plain dicts.
+
+    python -m benchmarks.bench_memory
+"""
+import sys
+import tracemalloc
+
+from benchmarks.fixtures import FakeTildesClient
+from squiggly.api import Client
+
+
+def traced(build):
+    """
+    Return the result of build() and the number of bytes it allocated.
+    """
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def main(num_comments=10000, num_topics=5000):
+    client = Client(tildes_client=FakeTildesClient(num_comments, num_topics))
+    topic = client._client.fetch_topic("abc")
+    listing = client._client.fetch_topic_listing("~test", per_page=num_topics)
+
+    builders = {
+        "comments": lambda: client._parse_topic(topic).comments,
+        "partial topics": lambda: [client._parse_partial_topic(t) for t in listing],
+    }
+    for name, build in builders.items():
+        records, total = traced(build)
+        # The dicts share their values with the records, so only the
+        # containers themselves are compared.
+        dicts, _ = traced(lambda: [record._asdict() for record in records])
+        record_size = sum(sys.getsizeof(record) for record in records)
+        dict_size = sum(sys.getsizeof(d) for d in dicts)
+        print(
+            f"{len(records)} {name}: {total / 1024:.0f} KiB total, "
+            f"containers {record_size / 1024:.0f} KiB as records, "
+            f"{dict_size / 1024:.0f} KiB as dicts"
+        )
+
+
+if __name__ == "__main__":
+    main()
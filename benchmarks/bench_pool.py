@@ -0,0 +1,42 @@
+"""
+Compare fetching and parsing several topics at once on threads vs processes.
+
+The fake client builds its comment tree in pure Python, which stands in for
+tildee's HTML parsing. The parameter is the number of worker processes, 0
+is the regular single-process client running on a thread pool.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from benchmarks.fixtures import FakeTildesClient
+from benchmarks.runner import benchmark
+from squiggly.api import Client
+from squiggly.pool import PooledClient
+
+NUM_TOPICS = 16
+NUM_COMMENTS = 500
+
+
+@benchmark("pool.get_topics", params=(0, 2, 4))
+def get_topics(processes):
+    factory = partial(FakeTildesClient, NUM_COMMENTS)
+    if processes:
+        client = PooledClient(processes=processes, tildes_client_factory=factory)
+    else:
+        client = Client(tildes_client=factory())
+    executor = ThreadPoolExecutor(max_workers=NUM_TOPICS)
+    topic_ids = [f"t{i}" for i in range(NUM_TOPICS)]
+
+    def run():
+        topics = list(executor.map(client.get_topic, topic_ids))
+        assert all(len(topic.comments) == NUM_COMMENTS for topic in topics)
+
+    def close():
+        executor.shutdown()
+        if processes:
+            client.shutdown()
+
+    # Start the worker processes before timing anything
+    run()
+    run.close = close
+    return run
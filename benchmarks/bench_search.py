@@ -0,0 +1,47 @@
+import random
+
+from benchmarks.runner import benchmark
+from squiggly.records import Comment, Topic
+from squiggly.search import SearchIndex
+
+# A vocabulary with a Zipf-like distribution, so that some words match
+# nearly every comment and others only a handful
+VOCABULARY = [f"w{i}" for i in range(20000)]
+WEIGHTS = [1 / (i + 1) for i in range(len(VOCABULARY))]
+QUERIES = ["w0", "w0 w1", "w12", "w1000", "w5 w20"]
+
+
+def make_index(num_comments, per_topic=100):
+    rng = random.Random(1)
+    index = SearchIndex()
+    for t in range(num_comments // per_topic):
+        comments = [
+            Comment(
+                f"{t}x{c}",
+                None,
+                0,
+                f"user{rng.randrange(500)}",
+                " ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(10, 120))),
+                "NORMAL",
+                None,
+            )
+            for c in range(per_topic)
+        ]
+        title = " ".join(rng.choices(VOCABULARY, WEIGHTS, k=5))
+        topic = Topic(
+            f"t{t}", "test", "a", title, None, "", per_topic, 0, None, False, [], comments
+        )
+        index.add_topic(topic)
+    return index
+
+
+@benchmark("search.query", params=(1000, 10000, 50000))
+def query(num_comments):
+    index = make_index(num_comments)
+
+    def run():
+        for text in QUERIES:
+            index.search(text)
+
+    run.close = index.close
+    return run
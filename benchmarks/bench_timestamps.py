@@ -0,0 +1,29 @@
+"""
+Compare timestamp decoding strategies on a synthetic 10k-comment topic.
+
+    python -m benchmarks.bench_timestamps
+"""
+import timeit
+from datetime import datetime
+
+from benchmarks.fixtures import FakeTildesClient, make_topic
+from squiggly.api import Client
+
+
+def decode_strptime(timestamp_str):
+    return datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%SZ")
+
+
+def main(num_comments=10000, repeat=5):
+    client = Client(tildes_client=FakeTildesClient())
+    topic = make_topic(num_comments)
+    comments = client._flatten_comment_tree(topic.comments)
+    timestamps = [comment.timestamp for comment, *_ in comments]
+
+    for name, decode in [("strptime", decode_strptime), ("Client", client._decode_timestamp)]:
+        times = timeit.repeat(lambda: [decode(t) for t in timestamps], number=1, repeat=repeat)
+        print(f"{name:>10}: {min(times) * 1000:8.2f} ms for {len(timestamps)} timestamps")
+
+
+if __name__ == "__main__":
+    main()
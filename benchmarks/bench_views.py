@@ -0,0 +1,80 @@
+from itertools import islice
+
+import urwid
+
+from benchmarks.fixtures import FakeTildesClient
+from benchmarks.runner import benchmark
+from squiggly.api import Client
+from squiggly.replay import HeadlessScreen
+from squiggly.views import CommentListBox, SquigglyView, TopicListBox
+
+SIZES = (100, 1000, 10000)
+SCREEN_SIZES = ((80, 24), (150, 50), (300, 100))
+
+
+def make_view(num_comments=100):
+    client = Client(tildes_client=FakeTildesClient(num_comments))
+    view = SquigglyView()
+    view.load_group_view(client.list_groups())
+    view.load_topic_view(client.list_topics("~test"))
+    view.load_comment_view(client.get_topic("t0"))
+    return view
+
+
+@benchmark("views.topic_listbox", params=SIZES)
+def topic_listbox(num_topics):
+    client = Client(tildes_client=FakeTildesClient(num_topics=num_topics), per_page=num_topics)
+    data = client.list_topics("~test")
+
+    def run():
+        TopicListBox(dict(data)).render((150, 50), focus=True)
+
+    return run
+
+
+@benchmark("views.comment_listbox", params=SIZES)
+def comment_listbox(num_comments):
+    client = Client(tildes_client=FakeTildesClient(num_comments))
+    data = client.get_topic("t0")
+    return lambda: CommentListBox(data).render((150, 50), focus=True)
+
+
+@benchmark("views.stream_first_screen", params=SIZES)
+def stream_first_screen(num_comments):
+    client = Client(tildes_client=FakeTildesClient(num_comments))
+    # Only measure our side, not generating the fake thread
+    topic = client._client.fetch_topic("t0")
+    client._client.fetch_topic = lambda topic_id: topic
+
+    def run():
+        comments = client.iter_topic("t0")
+        comment_listbox = CommentListBox(next(comments))
+        comment_listbox.append(list(islice(comments, 50)))
+        comment_listbox.render((150, 50), focus=True)
+
+    return run
+
+
+@benchmark("views.render_full", params=SCREEN_SIZES)
+def render_full(size):
+    view = make_view()
+    screen = HeadlessScreen(size)
+
+    def run():
+        urwid.CanvasCache.clear()
+        screen.draw_screen(size, view.render(size, focus=True))
+
+    return run
+
+
+@benchmark("views.render_scroll", params=SCREEN_SIZES)
+def render_scroll(size):
+    view = make_view(num_comments=1000)
+    screen = HeadlessScreen(size)
+
+    def run():
+        for _ in range(50):
+            view.keypress(size, "down")
+            screen.draw_screen(size, view.render(size, focus=True))
+
+    return run
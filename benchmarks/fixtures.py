@@ -0,0 +1,97 @@
+"""
+Synthetic tildee-like objects for benchmarking without the network.
+"""
+import random
+from datetime import datetime, timedelta
+from enum import Enum
+
+
+class AccessStatus(Enum):
+    FULL = 1
+    REMOVED = 2
+    DELETED = 3
+
+
+class FakeGroup:
+    def __init__(self, name, subscribed=True):
+        self.name = name
+        self.desc = f"Discussion about {name}"
+        self.num_subscribers = 1000
+        self.subscribed = subscribed
+
+
+class FakeComment:
+    def __init__(self, id36, timestamp, content):
+        self.id36 = id36
+        self.author = "someone"
+        self.content = content
+        self.status = AccessStatus.FULL
+        self.timestamp = timestamp
+        self.children = []
+
+
+class FakeTopic:
+    def __init__(self, id36, group, timestamp, comments=()):
+        self.id36 = id36
+        self.author = "someone"
+        self.group = group
+        self.link = None
+        self.title = f"Topic {id36}"
+        self.content = "Lorem ipsum dolor sit amet, " * 5
+        self.num_votes = 10
+        self.is_locked = False
+        self.tags = ["benchmark"]
+        self.timestamp = timestamp
+        self.comments = list(comments)
+        self.num_comments = str(count_comments(self.comments))
+
+
+def count_comments(comments):
+    return sum(1 + count_comments(comment.children) for comment in comments)
+
+
+def make_timestamp(index, start=datetime(2019, 5, 1)):
+    return (start + timedelta(seconds=index * 37)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def make_topic(num_comments, seed=0, id36="abc"):
+    """
+    Build a topic with a randomly shaped comment tree of the given size.
+    """
+    rng = random.Random(seed)
+    top_level = []
+    comments = []
+    for i in range(num_comments):
+        content = " ".join(["word"] * rng.randint(5, 200))
+        comment = FakeComment(f"c{i:x}", make_timestamp(i), content)
+        if comments and rng.random() < 0.7:
+            rng.choice(comments[-20:]).children.append(comment)
+        else:
+            top_level.append(comment)
+        comments.append(comment)
+    return FakeTopic(id36, "test", make_timestamp(0), top_level)
+
+
+class FakeTildesClient:
+    """
+    Stand-in for tildee.TildesClient that serves synthetic data.
+    """
+
+    def __init__(self, num_comments=100, num_topics=500, groups=("test", "music", "games")):
+        self.num_comments = num_comments
+        self.num_topics = num_topics
+        self.groups = groups
+
+    def fetch_groups(self):
+        return [FakeGroup(name) for name in self.groups]
+
+    def fetch_topic_listing(self, group="", after="", order="", period="", per_page=5):
+        start = int(after[1:], 16) + 1 if after else 0
+        stop = min(start + per_page, self.num_topics)
+        return [
+            FakeTopic(f"t{i:x}", group.lstrip("~"), make_timestamp(self.num_topics - i))
+            for i in range(start, stop)
+        ]
+
+    def fetch_topic(self, topic_id):
+        return make_topic(self.num_comments, id36=topic_id)
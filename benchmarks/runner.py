@@ -0,0 +1,74 @@
+"""
+A minimal benchmark runner that doesn't need anything beyond the stdlib.
+
+Benchmarks are registered with the @benchmark decorator. The decorated
+function receives one parameter value, does any setup work, and returns a
+zero-argument callable which is the thing that gets timed. If the callable
+has a close() method, it's called when the benchmark has finished.
+"""
+import fnmatch
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+registry = []
+
+
+def benchmark(name, params=(None,)):
+    def decorator(setup):
+        registry.append((name, params, setup))
+        return setup
+
+    return decorator
+
+
+def run(pattern="*", repeat=5, quick=False):
+    for name, params, setup in registry:
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        if quick:
+            params = params[:1]
+
+        for param in params:
+            func = setup(param)
+            try:
+                timings = timeit.repeat(func, number=1, repeat=repeat)
+            finally:
+                # Benchmarks that hold on to resources can attach a cleanup
+                if hasattr(func, "close"):
+                    func.close()
+            yield {
+                "name": name,
+                "param": format_param(param),
+                "repeat": repeat,
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "mean": statistics.mean(timings),
+            }
+
+
+def format_param(param):
+    if isinstance(param, tuple):
+        return "x".join(str(value) for value in param)
+    return param
+
+
+def result_key(result):
+    return f"{result['name']}[{result['param']}]"
+
+
+def dump(results, fp):
+    document = {
+        "created": time.time(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    json.dump(document, fp, indent=2)
+
+
+def load(fp):
+    return {result_key(result): result for result in json.load(fp)["results"]}
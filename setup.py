@@ -20,7 +20,12 @@ setuptools.setup(
     python_requires=">=3.7",
     install_requires=["urwid>=2.0.0", "tildee@git+https://github.com/michael-lazar/tildee"],
     extras_require={"test": ["pytest", "black", "isort", "flake8"]},
-    entry_points={"console_scripts": ["squiggly=squiggly.main:main"]},
+    entry_points={
+        "console_scripts": [
+            "squiggly=squiggly.main:main",
+            "squiggly-bench=squiggly.replay:main",
+        ]
+    },
     classifiers=[
         "Intended Audience :: End Users/Desktop",
         "Environment :: Console :: Curses",
@@ -1,5 +1,11 @@
+import time
+
 __version__ = "0.0.1"
 __title__ = "squiggly"
 __author__ = "Michael Lazar"
 __license__ = "Floodgap Free Software License"
 __copyright__ = "(c) 2019 Michael Lazar"
+
+# Taken when the package is first imported, before squiggly.main imports
+# anything else, so that the startup profile can include the imports
+START_TIME = time.perf_counter()
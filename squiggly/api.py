@@ -1,109 +1,307 @@
+import inspect
+import threading
 from datetime import datetime, timezone
+from functools import wraps
 
-from tildee import TildesClient
+from squiggly.metrics import metrics
+from squiggly.records import Comment, Group, PartialTopic, Topic
+from squiggly.transport import NotModified
+
+USER_AGENT = "michael-lazar/squiggly"
+
+# Bump whenever the parsed data changes shape, so stale cache entries are ignored
+CACHE_VERSION = 2
+
+
+def cached(ttl, params=()):
+    """
+    Cache the result of a client method for ttl seconds.
+
+    The cache key is built from the method name and its arguments, with
+    default values filled in so that f(x) and f(x, "") share an entry.
+    The client attributes named in params, e.g. the page size, are part of
+    the key too.
+
+    When an expired entry is still around and the client has a transport,
+    the page is revalidated with a conditional request. If the server says
+    that it hasn't changed, the old data is reused without downloading or
+    parsing the page again.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def cache_key(client, *args, **kwargs):
+            arguments = signature.bind(client, *args, **kwargs)
+            arguments.apply_defaults()
+            values = [getattr(client, name) for name in params]
+            values.extend(list(arguments.arguments.values())[1:])
+            return (CACHE_VERSION, func.__name__, *values)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None:
+                return func(self, *args, **kwargs)
+
+            key = cache_key(self, *args, **kwargs)
+            data = self.cache.get(key)
+            if data is not None:
+                metrics.incr(f"client.{func.__name__}.hit")
+                return data
+
+            metrics.incr(f"client.{func.__name__}.miss")
+            stale = self.cache.get(key, stale=True)
+            if stale is not None and self.transport is not None:
+                try:
+                    with self.transport.conditional():
+                        data = func(self, *args, **kwargs)
+                except NotModified:
+                    metrics.incr(f"client.{func.__name__}.not_modified")
+                    data = stale
+            else:
+                data = func(self, *args, **kwargs)
+
+            self.cache.set(key, data, ttl)
+            return data
+
+        wrapper.cache_key = cache_key
+        wrapper.ttl = ttl
+        return wrapper
+
+    return decorator
 
 
 class Client:
-    def __init__(self):
-        self._client = TildesClient(user_agent="michael-lazar/squiggly", ratelimit=0)
+    def __init__(self, cache=None, per_page=5, tildes_client=None, transport=None, index=None):
+        self.transport = transport
+        self.cache = cache
+        self.per_page = per_page
+        self.index = index
+        self._tildes_client = tildes_client
+        self._lock = threading.Lock()
+
+    @property
+    def _client(self):
+        """
+        The TildesClient used to talk to the site, created on first use.
+
+        Importing tildee also pulls in requests and an HTML parser, which is
+        most of squiggly's import time. Deferring it means that the first
+        screen can be drawn before it happens, and the first request is
+        usually made from a background thread anyway.
+        """
+        if self._tildes_client is None:
+            with self._lock:
+                if self._tildes_client is None:
+                    self._tildes_client = self._create_tildes_client()
+        return self._tildes_client
+
+    def _create_tildes_client(self):
+        if self.transport is None:
+            from tildee import TildesClient
+
+            return TildesClient(user_agent=USER_AGENT, ratelimit=0)
+
+        from squiggly.tildes import TransportTildesClient
+
+        return TransportTildesClient(self.transport, user_agent=USER_AGENT, ratelimit=0)
+
+    def get_cached(self, method, *args, **kwargs):
+        """
+        Return the cached result of a client method without making a request.
+
+        Expired entries are returned too, this is meant for showing something
+        on the screen while the real data is loading. Returns None if the
+        result has never been cached.
+        """
+        if self.cache is None:
+            return None
+        key = getattr(type(self), method).cache_key(self, *args, **kwargs)
+        return self.cache.get(key, stale=True)
 
     def _decode_timestamp(self, timestamp_str):
-        if timestamp_str is None:
+        """
+        Parse a tildes timestamp, e.g. "2019-05-01T12:00:00Z", as a UTC datetime.
+
+        This is called for every topic and comment, and fromisoformat() is
+        many times faster than strptime() for this fixed format.
+        """
+        if not timestamp_str:
             return None
 
-        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%SZ")
-        timestamp.replace(tzinfo=timezone.utc)
+        if timestamp_str.endswith("Z"):
+            timestamp_str = timestamp_str[:-1] + "+00:00"
+
+        timestamp = datetime.fromisoformat(timestamp_str)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
         return timestamp
 
-    def _flatten_comment_tree(self, comments, level=0, parent_id=None):
-        for c in comments:
-            c.level = level
-            c.parent_id = parent_id
+    def _iter_comment_tree(self, comments):
+        """
+        Walk the comment tree depth-first.
 
-        flattened_comments = []
-        stack = comments[::-1]
+        Yields (comment, level, parent_id) tuples in display order.
+        """
+        stack = [(comment, 0, None) for comment in reversed(comments)]
         while stack:
-            comment = stack.pop()
-            for child in comment.children:
-                child.level = comment.level + 1
-                child.parent_id = comment.id36
-                stack.append(child)
-            flattened_comments.append(comment)
-        return flattened_comments
+            comment, level, parent_id = stack.pop()
+            for child in reversed(comment.children):
+                stack.append((child, level + 1, comment.id36))
+            yield comment, level, parent_id
+
+    def _flatten_comment_tree(self, comments):
+        return list(self._iter_comment_tree(comments))
 
     def _parse_group(self, group):
-        data = {}
-        data["type"] = "group"
-        data["desc"] = group.desc
-        data["name"] = f"~{group.name}"
-        data["num_subscribers"] = group.num_subscribers
-        data["subscribed"] = group.subscribed
-        return data
+        return Group(
+            name=f"~{group.name}",
+            desc=group.desc,
+            num_subscribers=group.num_subscribers,
+            subscribed=group.subscribed,
+        )
 
     def _parse_partial_topic(self, topic):
-        data = {}
-        data["type"] = "partial_topic"
-        data["author"] = topic.author
-        data["group"] = topic.group
-        data["id36"] = topic.id36
-        data["link"] = topic.link
-        data["num_comments"] = topic.num_comments
-        data["num_votes"] = topic.num_votes
-        data["title"] = topic.title
-        data["content"] = topic.content
-        data["timestamp"] = self._decode_timestamp(topic.timestamp)
-        return data
+        return PartialTopic(
+            id36=topic.id36,
+            group=topic.group,
+            author=topic.author,
+            title=topic.title,
+            link=topic.link,
+            content=topic.content,
+            num_comments=topic.num_comments,
+            num_votes=topic.num_votes,
+            timestamp=self._decode_timestamp(topic.timestamp),
+        )
 
     def _parse_topic(self, topic):
         comments = self._flatten_comment_tree(topic.comments)
+        header = self._parse_topic_header(topic)
+        return header._replace(comments=[self._parse_comment(*args) for args in comments])
 
-        data = {}
-        data["type"] = "topic"
-        data["author"] = topic.author
-        data["group"] = topic.group
-        data["id36"] = topic.id36
-        data["link"] = topic.link
-        data["num_comments"] = int(topic.num_comments)
-        data["num_votes"] = topic.num_votes
-        data["title"] = topic.title
-        data["content"] = topic.content
-        data["is_locked"] = topic.is_locked
-        data["tags"] = topic.tags
-        data["timestamp"] = self._decode_timestamp(topic.timestamp)
-        data["comments"] = [self._parse_comment(comment) for comment in comments]
-        return data
+    def _parse_topic_header(self, topic):
+        return Topic(
+            id36=topic.id36,
+            group=topic.group,
+            author=topic.author,
+            title=topic.title,
+            link=topic.link,
+            content=topic.content,
+            num_comments=int(topic.num_comments),
+            num_votes=topic.num_votes,
+            timestamp=self._decode_timestamp(topic.timestamp),
+            is_locked=topic.is_locked,
+            tags=topic.tags,
+            comments=[],
+        )
 
-    def _parse_comment(self, comment):
-        data = {}
-        data["type"] = "comment"
-        data["level"] = comment.level
-        data["parent_id"] = comment.parent_id
-        data["author"] = comment.author
-        data["content"] = comment.content.strip()
-        data["id36"] = comment.id36
-        data["status"] = comment.status.name
-        data["timestamp"] = self._decode_timestamp(comment.timestamp)
-        return data
+    def _parse_comment(self, comment, level=0, parent_id=None):
+        return Comment(
+            id36=comment.id36,
+            parent_id=parent_id,
+            level=level,
+            author=comment.author,
+            content=comment.content.strip(),
+            status=comment.status.name,
+            timestamp=self._decode_timestamp(comment.timestamp),
+        )
 
+    @cached(ttl=24 * 60 * 60)
     def list_groups(self):
-        groups = self._client.fetch_groups()
+        with metrics.timer("client.list_groups.fetch"):
+            groups = self._client.fetch_groups()
 
-        data = {}
-        data["groups"] = [self._parse_group(group) for group in groups]
+        with metrics.timer("client.list_groups.parse"):
+            data = {}
+            data["groups"] = [self._parse_group(group) for group in groups]
         return data
 
+    @cached(ttl=5 * 60, params=("per_page",))
     def list_topics(self, group="", after="", order="", period=""):
-        topics = self._client.fetch_topic_listing(group, after, order, period, per_page=5)
-
-        data = {}
-        data["group"] = group
-        data["after"] = after
-        data["order"] = order
-        data["period"] = period
-        data["last"] = topics[-1].id36 if topics else None
-        data["topics"] = [self._parse_partial_topic(topic) for topic in topics]
+        with metrics.timer("client.list_topics.fetch"):
+            topics = self._client.fetch_topic_listing(
+                group, after, order, period, per_page=self.per_page
+            )
+
+        with metrics.timer("client.list_topics.parse"):
+            data = {}
+            data["group"] = group
+            data["after"] = after
+            data["order"] = order
+            data["period"] = period
+            data["last"] = topics[-1].id36 if topics else None
+            data["topics"] = [self._parse_partial_topic(topic) for topic in topics]
+
+        if self.index is not None:
+            self.index.add_topics_later(data["topics"])
         return data
 
+    @cached(ttl=2 * 60)
     def get_topic(self, topic_id):
-        topic = self._client.fetch_topic(topic_id)
-        return self._parse_topic(topic)
+        with metrics.timer("client.get_topic.fetch"):
+            topic = self._client.fetch_topic(topic_id)
+
+        with metrics.timer("client.get_topic.parse"):
+            topic = self._parse_topic(topic)
+
+        if self.index is not None:
+            self.index.add_topic_later(topic)
+        return topic
+
+    def iter_topic(self, topic_id, store=None):
+        """
+        Stream a topic, yielding the topic itself and then its comments.
+
+        The topic is yielded first with an empty list of comments. Comments
+        are parsed one at a time as the generator is consumed, so the start
+        of a long thread can be displayed without waiting for all of it to
+        be parsed. The complete topic is cached for get_topic() once the
+        generator has been exhausted.
+
+        Caching and indexing a long thread is slow. If the generator is
+        consumed on the UI thread, pass a store function that hands the
+        complete topic to store_topic() on another thread instead.
+        """
+        key = self.get_topic.cache_key(self, topic_id)
+        topic = self.cache.get(key) if self.cache is not None else None
+        if topic is not None:
+            metrics.incr("client.iter_topic.hit")
+            yield topic._replace(comments=[])
+            yield from topic.comments
+            return
+
+        metrics.incr("client.iter_topic.miss")
+        with metrics.timer("client.get_topic.fetch"):
+            topic = self._client.fetch_topic(topic_id)
+
+        header = self._parse_topic_header(topic)
+        yield header
+
+        comments = []
+        for args in self._iter_comment_tree(topic.comments):
+            comment = self._parse_comment(*args)
+            comments.append(comment)
+            yield comment
+
+        topic = header._replace(comments=comments)
+        if store is not None:
+            store(topic)
+        else:
+            self.store_topic(topic)
+
+    def store_topic(self, topic):
+        """
+        Cache and index a complete topic that was streamed with iter_topic().
+        """
+        if self.cache is not None:
+            self.cache.set(self.get_topic.cache_key(self, topic.id36), topic, self.get_topic.ttl)
+        if self.index is not None:
+            self.index.add_topic_later(topic)
+
+    def refresh_topic(self, topic_id):
+        """
+        Fetch the topic again, even if there's a fresh copy in the cache.
+        """
+        if self.cache is not None:
+            self.cache.expire(self.get_topic.cache_key(self, topic_id))
+        return self.get_topic(topic_id)
@@ -0,0 +1,263 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def default_cache_dir():
+    """
+    Return the directory that squiggly should use for persistent caches.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_home, "squiggly")
+
+
+class LRUCache(OrderedDict):
+    """
+    A dict that only keeps the most recently used max_size items.
+    """
+
+    def __init__(self, max_size=1024):
+        super().__init__()
+        self.max_size = max_size
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+class DiskStore:
+    """
+    Persist pickled cache entries to a sqlite database.
+
+    The database has its own limits, which are larger than the in-memory
+    ones. The number of entries and their total size are kept track of as
+    they're written. When either limit is exceeded, the entries that expire
+    soonest are deleted until the database is a little below both, so that
+    a full cache isn't sorted again on every write.
+    """
+
+    max_age = 7 * 24 * 60 * 60
+    trim_ratio = 0.9
+
+    def __init__(self, path, max_entries=4096, max_bytes=256 * 1024 * 1024):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value BLOB)"
+        )
+        # Keep expired entries for a while, they can still be revalidated
+        self._db.execute("DELETE FROM cache WHERE expires < ?", (time.time() - self.max_age,))
+        self._db.commit()
+        self._entries, self._bytes = self._db.execute(
+            "SELECT count(*), coalesce(sum(length(value)), 0) FROM cache"
+        ).fetchone()
+
+    def get(self, key):
+        return self._db.execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+
+    def set(self, key, expires, value):
+        self._forget(key)
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache (key, expires, value) VALUES (?, ?, ?)",
+            (key, expires, value),
+        )
+        self._entries += 1
+        self._bytes += len(value)
+        if self._entries > self.max_entries or self._bytes > self.max_bytes:
+            self.trim()
+        self._db.commit()
+
+    def trim(self):
+        max_entries = self.max_entries * self.trim_ratio
+        max_bytes = self.max_bytes * self.trim_ratio
+        evicted = []
+        for key, size in self._db.execute("SELECT key, length(value) FROM cache ORDER BY expires"):
+            if self._entries <= max_entries and self._bytes <= max_bytes:
+                break
+            evicted.append((key,))
+            self._entries -= 1
+            self._bytes -= size
+        self._db.executemany("DELETE FROM cache WHERE key = ?", evicted)
+
+    def _forget(self, key):
+        """
+        Stop counting an entry that's about to be replaced or deleted.
+        """
+        row = self._db.execute("SELECT length(value) FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._entries -= 1
+            self._bytes -= row[0]
+
+    def expire(self, key, expires):
+        self._db.execute("UPDATE cache SET expires = ? WHERE key = ?", (expires, key))
+        self._db.commit()
+
+    def delete(self, key):
+        self._forget(key)
+        self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+        self._db.commit()
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
+        self._db.commit()
+        self._entries = self._bytes = 0
+
+    def close(self):
+        self._db.close()
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache for client responses with per-entry expiration.
+
+    Values are stored pickled, which means that every lookup returns a fresh
+    copy that the caller is free to mutate, and that the size of each entry
+    is known exactly when enforcing the byte limit. If a path is given, the
+    entries are also written through to a sqlite database so they survive
+    between sessions, up to disk_entries and disk_bytes.
+    """
+
+    def __init__(
+        self,
+        max_entries=512,
+        max_bytes=64 * 1024 * 1024,
+        path=None,
+        disk_entries=4096,
+        disk_bytes=256 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._store = DiskStore(path, disk_entries, disk_bytes) if path else None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._bytes
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def get(self, key, default=None, stale=False):
+        """
+        Return the cached value for the key, or default if it's missing or expired.
+
+        Expired entries are kept around until they're evicted. They can still
+        be retrieved with stale=True, e.g. in order to revalidate them.
+        """
+        key = repr(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._store is not None:
+                entry = self._store.get(key)
+                if entry is not None:
+                    self._insert(key, *entry)
+
+            if entry is None:
+                if not stale:
+                    self.misses += 1
+                return default
+
+            expires, blob = entry
+            if stale:
+                pass
+            elif expires < time.time():
+                self.misses += 1
+                return default
+            else:
+                self.hits += 1
+            self._entries.move_to_end(key)
+
+        return pickle.loads(blob)
+
+    def set(self, key, value, ttl):
+        key = repr(key)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires = time.time() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, expires, blob)
+            if self._store is not None:
+                self._store.set(key, expires, blob)
+
+    def expire(self, key):
+        """
+        Mark an entry as expired, it can still be retrieved with stale=True.
+        """
+        key = repr(key)
+        # Expire it just now rather than at the epoch, so that the disk store
+        # keeps it around for revalidation like any other expired entry
+        expires = time.time() - 1
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (expires, entry[1])
+            if self._store is not None:
+                self._store.expire(key, expires)
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(repr(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._store is not None:
+                self._store.clear()
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+
+    def _insert(self, key, expires, blob):
+        if len(blob) > self.max_bytes:
+            return
+
+        self._entries[key] = (expires, blob)
+        self._bytes += len(blob)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+        if self._store is not None:
+            self._store.delete(key)
@@ -0,0 +1,188 @@
+"""
+Convert the HTML content of topics and comments into urwid text markup.
+"""
+import re
+from html.parser import HTMLParser
+
+from squiggly.cache import LRUCache
+
+INLINE_ATTRS = {
+    "em": "content_em",
+    "i": "content_em",
+    "strong": "content_strong",
+    "b": "content_strong",
+    "code": "content_code",
+    "pre": "content_code",
+    "a": "content_link",
+    "del": "content_strike",
+    "s": "content_strike",
+    "h1": "content_heading",
+    "h2": "content_heading",
+    "h3": "content_heading",
+    "h4": "content_heading",
+    "h5": "content_heading",
+    "h6": "content_heading",
+    "blockquote": "content_quote",
+}
+
+BLOCK_TAGS = frozenset(
+    ["p", "div", "blockquote", "pre", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "table"]
+)
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class MarkupParser(HTMLParser):
+    """
+    Translate a fragment of HTML into a list of urwid (attr, text) tuples.
+
+    Inline tags map to palette entries, the innermost tag wins when they're
+    nested. Paragraphs are separated by blank lines, block quotes are drawn
+    with a bar in the left margin and list items get bullets or numbers.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.markup = []
+        self.attrs = []
+        self.lists = []
+        self.links = []
+        self.quote_depth = 0
+        self.pre_depth = 0
+        self.trailing_newlines = None
+        self.line_start = True
+
+    def write(self, text, attr=None):
+        if not text:
+            return
+
+        attr = attr or (self.attrs[-1] if self.attrs else None)
+        self.markup.append((attr, text) if attr else text)
+        stripped = text.rstrip("\n")
+        if stripped:
+            self.trailing_newlines = len(text) - len(stripped)
+        else:
+            self.trailing_newlines = (self.trailing_newlines or 0) + len(text)
+
+    def newline(self, count=1):
+        """
+        Make sure that the output ends with at least count newlines.
+        """
+        if self.trailing_newlines is None:
+            # Nothing has been written yet
+            return
+
+        missing = count - self.trailing_newlines
+        if missing > 0:
+            self.write("\n" * missing)
+        self.line_start = True
+
+    def start_line(self):
+        if self.line_start:
+            self.line_start = False
+            if self.quote_depth:
+                self.write("│ " * self.quote_depth, "content_quote")
+            if self.lists:
+                self.write("  " * (len(self.lists) - 1))
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.newline(1 if self.lists else 2)
+        if tag == "blockquote":
+            self.quote_depth += 1
+        elif tag == "pre":
+            self.pre_depth += 1
+        elif tag in ("ul", "ol"):
+            self.lists.append(0 if tag == "ol" else None)
+        elif tag == "li":
+            self.newline()
+            self.start_line()
+            if self.lists and self.lists[-1] is not None:
+                self.lists[-1] += 1
+                self.write(f"{self.lists[-1]}. ")
+            else:
+                self.write("• ")
+        elif tag == "br":
+            self.newline()
+        elif tag == "hr":
+            self.newline()
+            self.write("―" * 20)
+            self.newline()
+        elif tag == "a":
+            self.links.append((dict(attrs).get("href"), len(self.markup)))
+
+        if tag in INLINE_ATTRS:
+            self.attrs.append(INLINE_ATTRS[tag])
+
+    def handle_endtag(self, tag):
+        if tag in INLINE_ATTRS and INLINE_ATTRS[tag] in self.attrs:
+            # Remove the innermost matching attribute, tolerating bad nesting
+            index = len(self.attrs) - 1 - self.attrs[::-1].index(INLINE_ATTRS[tag])
+            del self.attrs[index]
+
+        if tag == "blockquote":
+            self.quote_depth = max(self.quote_depth - 1, 0)
+        elif tag == "pre":
+            self.pre_depth = max(self.pre_depth - 1, 0)
+        elif tag in ("ul", "ol") and self.lists:
+            self.lists.pop()
+        elif tag == "a" and self.links:
+            href, start = self.links.pop()
+            text = "".join(m if isinstance(m, str) else m[1] for m in self.markup[start:])
+            if href and href != text and not href.startswith("/"):
+                self.write(f" <{href}>", "content_link")
+
+        if tag in BLOCK_TAGS:
+            self.newline(1 if self.lists else 2)
+
+    def handle_data(self, data):
+        if self.pre_depth:
+            lines = data.split("\n")
+            for i, line in enumerate(lines):
+                if i:
+                    self.newline()
+                if line:
+                    self.start_line()
+                    self.write(line)
+            return
+
+        text = WHITESPACE.sub(" ", data)
+        if self.line_start:
+            text = text.lstrip()
+        if text:
+            self.start_line()
+            self.write(text)
+
+    def get_markup(self):
+        while self.markup:
+            last = self.markup[-1]
+            text = last if isinstance(last, str) else last[1]
+            stripped = text.rstrip()
+            if stripped:
+                self.markup[-1] = stripped if isinstance(last, str) else (last[0], stripped)
+                break
+            self.markup.pop()
+        return self.markup or [""]
+
+
+markup_cache = LRUCache(2048)
+
+
+def render_content(content):
+    """
+    Return urwid text markup for the content of a topic or comment.
+
+    Content that doesn't contain any HTML is returned unchanged.
+    """
+    if not content:
+        return ""
+    if "<" not in content:
+        return content
+
+    markup = markup_cache.get(content)
+    if markup is None:
+        parser = MarkupParser()
+        parser.feed(content)
+        parser.close()
+        markup = markup_cache[content] = parser.get_markup()
+    return markup
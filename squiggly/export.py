@@ -0,0 +1,182 @@
+"""
+Export groups, topic listings and comment threads as JSON Lines.
+
+Every line is a JSON object with a "type" of "group", "topic" (an entry in
+a topic listing) or "thread" (a topic with all of its comments). Records
+are written as soon as they've been fetched, one page at a time, so that
+exports of any size run in constant memory.
+"""
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def to_json(value):
+    """
+    Convert records into something that json.dumps() can handle.
+    """
+    if isinstance(value, tuple) and hasattr(value, "_asdict"):
+        return {name: to_json(item) for name, item in value._asdict().items()}
+    elif isinstance(value, dict):
+        return {name: to_json(item) for name, item in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    elif isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class Checkpoint:
+    """
+    The progress of an export, saved after every page so it can be resumed.
+
+    For each group, this records the id36 of the last topic that has been
+    exported, the number of pages, and whether the end of the listing has
+    been reached. Records are written before the checkpoint is saved, so a
+    resumed export never skips anything but may repeat part of a page.
+    The id36 of every thread that couldn't be fetched is recorded as well.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.groups = {}
+        self.failed = []
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.groups = data["groups"]
+            self.failed = data.get("failed", [])
+
+    def get(self, group):
+        return self.groups.get(group, {"after": "", "pages": 0, "done": False})
+
+    def fail(self, topic_id):
+        """
+        Record a thread that couldn't be fetched, saved along with the next page.
+        """
+        if topic_id not in self.failed:
+            self.failed.append(topic_id)
+
+    def save(self, group, after, pages, done):
+        self.groups[group] = {"after": after, "pages": pages, "done": done}
+        if self.path is None:
+            return
+
+        # Write to a temporary file first, so that an interrupted save can't
+        # leave a truncated checkpoint behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"groups": self.groups, "failed": self.failed}, f)
+        os.replace(temp_path, self.path)
+
+
+def export(
+    client,
+    out,
+    groups=None,
+    pages=None,
+    threads=True,
+    workers=4,
+    checkpoint=None,
+    progress=None,
+):
+    """
+    Write every group, its topic listing and optionally the full threads.
+
+    Listings are followed page by page until the end, or for at most pages
+    pages per group. The threads on a page and the next page of the listing
+    are fetched concurrently by the worker threads. Output is in the same
+    order as the listing regardless. A thread that fails to download is
+    logged and recorded in the checkpoint, and the export carries on.
+    """
+    checkpoint = checkpoint or Checkpoint()
+
+    def write(kind, record):
+        data = to_json(record)
+        data["type"] = kind
+        out.write(json.dumps(data, ensure_ascii=False))
+        out.write("\n")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for group in client.list_groups()["groups"]:
+            if groups and group.name not in groups:
+                continue
+
+            state = checkpoint.get(group.name)
+            if state["done"]:
+                continue
+            if not state["pages"]:
+                write("group", group)
+
+            after, page = state["after"], state["pages"]
+            if pages is not None and page >= pages:
+                continue
+
+            listing = executor.submit(client.list_topics, group.name, after)
+            while True:
+                data = listing.result()
+                after, page = data["last"], page + 1
+
+                # Start on the next page while this one is being written
+                if after and (pages is None or page < pages):
+                    listing = executor.submit(client.list_topics, group.name, after)
+
+                futures = []
+                if threads:
+                    futures = [executor.submit(client.get_topic, t.id36) for t in data["topics"]]
+                for topic in data["topics"]:
+                    write("topic", topic)
+                for topic, future in zip(data["topics"], futures):
+                    try:
+                        write("thread", future.result())
+                    except Exception:
+                        logger.exception(f"Unable to export topic {topic.id36}")
+                        checkpoint.fail(topic.id36)
+
+                out.flush()
+                checkpoint.save(group.name, after or "", page, done=not after)
+                if progress is not None:
+                    progress(f"Exported page {page} of {group.name}")
+                if not after or (pages is not None and page >= pages):
+                    break
+
+
+def main(args, client):
+    """
+    Run the export subcommand with the parsed command line arguments, and
+    return the exit status.
+    """
+
+    def progress(message):
+        print(message, file=sys.stderr)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    failed_before = len(checkpoint.failed)
+    try:
+        export(
+            client,
+            sys.stdout,
+            groups={f"~{name.lstrip('~')}" for name in args.group},
+            pages=args.pages,
+            threads=not args.no_threads,
+            workers=args.workers,
+            checkpoint=checkpoint,
+            progress=progress if not args.quiet else None,
+        )
+    except BrokenPipeError:
+        # The output was piped into something like head that exited early.
+        # Point stdout at devnull, so that flushing it on exit can't fail too.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+
+    failed = checkpoint.failed[failed_before:]
+    if failed:
+        print(f"Unable to export {len(failed)} threads: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,244 @@
+import logging
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from squiggly.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class FetchRequest:
+    """
+    Handle for a single background call submitted to the Fetcher.
+    """
+
+    def __init__(self, key, call=None, callback=None, errback=None):
+        self.key = key
+        self.call = call
+        self.callback = callback
+        self.errback = errback
+        self.cancelled = False
+        self.future = None
+        # Every request waiting on the same future, including this one
+        self.shared = [self]
+
+    def cancel(self):
+        """
+        Drop the request, the callbacks will never be invoked.
+
+        The underlying call can't be interrupted once it has started running
+        on a worker thread, but its result will be silently discarded. It's
+        only cancelled at all once no other request is waiting for it.
+        """
+        self.cancelled = True
+        if self.future is not None and all(request.cancelled for request in self.shared):
+            self.future.cancel()
+
+
+class Fetcher:
+    """
+    Run blocking client calls on a thread pool and deliver the results back
+    to the thread running the urwid main loop.
+
+    Worker threads never touch widgets. When a call finishes, the result is
+    pushed onto a queue and a byte is written to a pipe that the main loop
+    is watching. The main loop then drains the queue and invokes the
+    callbacks, where it's safe to update the UI.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._results = queue.Queue()
+        self._pending = {}
+        # Requests in flight by call, for the calls that can be hashed
+        self._calls = {}
+        self._main_loop = None
+        self._pipe = None
+
+    def attach(self, main_loop):
+        """
+        Start delivering results through the given urwid MainLoop.
+        """
+        self._main_loop = main_loop
+        self._pipe = main_loop.watch_pipe(self._on_pipe)
+
+    def shutdown(self):
+        for request in list(self._pending.values()):
+            request.cancel()
+        self._pending.clear()
+        self._calls.clear()
+        self._executor.shutdown(wait=False)
+        if self._pipe is not None:
+            self._main_loop.remove_watch_pipe(self._pipe)
+            os.close(self._pipe)
+            self._pipe = None
+
+    @property
+    def busy(self):
+        return bool(self._pending)
+
+    def submit(self, func, *args, key=None, callback=None, errback=None):
+        """
+        Call func(*args) on a worker thread.
+
+        Submitting a request with the same key as a request that's still in
+        flight will cancel the older request, because its result has been
+        superseded by the new one. The exception is when both make the same
+        call, e.g. when "Load..." is pressed twice. Then the request in
+        flight is kept and its result is delivered to the new callbacks.
+
+        A call that's already in flight under a different key, e.g. a page
+        that's being prefetched when "Load..." is pressed, isn't made again
+        either. The new request waits for the same result, and both get it.
+        """
+        if key is None:
+            key = object()
+
+        call = (func, args)
+        request = self._pending.get(key)
+        if request is not None and request.call == call and not request.cancelled:
+            metrics.incr("fetch.deduplicated")
+            request.callback = callback
+            request.errback = errback
+            return request
+        self.cancel(key)
+
+        try:
+            shared = self._calls.get(call)
+        except TypeError:
+            # Calls with unhashable arguments, e.g. a topic to store, are never shared
+            shared = call = None
+
+        request = FetchRequest(key, call, callback, errback)
+        self._pending[key] = request
+        if shared is not None and not shared.future.cancelled():
+            metrics.incr("fetch.deduplicated")
+            request.shared = shared.shared
+            request.shared.append(request)
+            request.future = shared.future
+        else:
+            request.future = self._executor.submit(func, *args)
+            if call is not None:
+                self._calls[call] = request
+        request.future.add_done_callback(lambda future: self._deliver(request, future))
+        return request
+
+    def in_flight(self, func, *args):
+        """
+        Return whether func(*args) was submitted and its result can still be shared.
+        """
+        request = self._calls.get((func, args))
+        return request is not None and not request.future.cancelled()
+
+    def cancel(self, key):
+        request = self._pending.pop(key, None)
+        if request is not None:
+            request.cancel()
+
+    def _deliver(self, request, future):
+        """
+        Called from the worker thread when the call has finished.
+        """
+        self._results.put((request, future))
+        if self._pipe is not None:
+            os.write(self._pipe, b"\n")
+
+    def _on_pipe(self, data):
+        self.process_pending()
+        return True
+
+    def process_pending(self):
+        """
+        Invoke the callbacks for all of the requests that have finished.
+        """
+        while True:
+            try:
+                request, future = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if self._pending.get(request.key) is request:
+                del self._pending[request.key]
+            if request.call is not None and self._calls.get(request.call) is request.shared[0]:
+                del self._calls[request.call]
+            if request.cancelled or future.cancelled():
+                continue
+
+            error = future.exception()
+            if error is None:
+                if request.callback is not None:
+                    request.callback(future.result())
+            elif request.errback is not None:
+                request.errback(error)
+            else:
+                logger.error("Unhandled error in background fetch", exc_info=error)
+
+
+class IdleStream:
+    """
+    Feed the items of an iterator to a callback in batches on the main loop.
+
+    The first batch is delivered immediately. Each following batch is
+    scheduled with a short alarm rather than a zero-delay one, because urwid
+    runs due alarms before it goes idle and redraws the screen. This lets
+    the screen update and keypresses get handled between batches.
+    """
+
+    def __init__(
+        self,
+        main_loop,
+        iterator,
+        callback,
+        errback=None,
+        on_done=None,
+        batch_size=100,
+        interval=0.001,
+    ):
+        self.main_loop = main_loop
+        self.iterator = iter(iterator)
+        self.callback = callback
+        self.errback = errback
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.interval = interval
+        self.done = False
+        self._alarm = None
+
+    def start(self, first_batch=None):
+        """
+        Deliver the first batch, optionally with a different size, and
+        schedule the rest.
+        """
+        self._step(batch_size=first_batch)
+
+    def cancel(self):
+        self.done = True
+        if self._alarm is not None:
+            self.main_loop.remove_alarm(self._alarm)
+            self._alarm = None
+
+    def _step(self, *_, batch_size=None):
+        self._alarm = None
+        batch_size = batch_size or self.batch_size
+        try:
+            batch = list(islice(self.iterator, batch_size))
+        except Exception as error:
+            self.done = True
+            if self.errback is not None:
+                self.errback(error)
+            else:
+                logger.error("Unhandled error in stream", exc_info=error)
+            return
+
+        if batch:
+            self.callback(batch)
+
+        if len(batch) < batch_size:
+            self.done = True
+            if self.on_done is not None:
+                self.on_done()
+        elif not self.done:
+            self._alarm = self.main_loop.set_alarm_in(self.interval, self._step)
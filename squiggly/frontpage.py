@@ -0,0 +1,122 @@
+"""
+A front page that merges the topic listings of several groups.
+"""
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+from squiggly.metrics import metrics
+
+# Listing orders that can be merged, with the sort key that the site uses
+# for them. Topics are listed with the highest key first.
+SORT_KEYS = {
+    "new": lambda topic: topic.timestamp.timestamp() if topic.timestamp else 0.0,
+    "votes": lambda topic: topic.num_votes,
+}
+
+
+class FrontPage:
+    """
+    Merge the topic listings of several groups into one, page by page.
+
+    Every group listing is already sorted, so they can be merged with a
+    heap that holds the next topic from each group. A group's next page is
+    only fetched once all of its buffered topics have been merged, using
+    that group's own "last" cursor. A quiet group therefore costs a single
+    request no matter how far the front page is scrolled. All of the
+    listings that are needed at the same time, e.g. every group for the
+    first page, are fetched concurrently by up to workers threads.
+
+    The merged topics are kept, and pages are looked up by the topic they
+    follow like the site's own listings. A page whose request was
+    cancelled after it had been merged can be asked for again.
+    """
+
+    def __init__(self, client, groups, order="new", period="", per_page=None, workers=4):
+        self.client = client
+        self.groups = list(groups)
+        self.order = order
+        self.period = period
+        self.per_page = per_page or client.per_page
+        self.workers = workers
+        self.sort_key = SORT_KEYS[order]
+
+        self._buffers = {group: deque() for group in self.groups}
+        # The cursor for each group's next page, None once the listing has ended
+        self._cursors = {group: "" for group in self.groups}
+        self._needs_fetch = set(self.groups)
+        self._heap = []
+        self._merged = []
+        # The position of every merged topic, by id36
+        self._positions = {}
+        self._counter = count()
+        self._lock = threading.Lock()
+
+    def next_page(self, after=""):
+        """
+        Return the page of the merged listing that follows the topic with
+        the given id36, in the same format as Client.list_topics().
+        """
+        with self._lock:
+            start = self._positions[after] + 1 if after else 0
+            while len(self._merged) < start + self.per_page:
+                self._fetch()
+                if not self._heap:
+                    break
+                _, _, group = heapq.heappop(self._heap)
+                topic = self._buffers[group].popleft()
+                self._positions[topic.id36] = len(self._merged)
+                self._merged.append(topic)
+                self._push(group)
+            topics = self._merged[start : start + self.per_page]
+
+        data = {}
+        data["group"] = "subscribed"
+        data["order"] = self.order
+        data["period"] = self.period
+        data["last"] = topics[-1].id36 if topics else None
+        data["topics"] = topics
+        data["feed"] = self
+        return data
+
+    def _push(self, group):
+        """
+        Put the group's next topic on the heap, or mark it for fetching.
+        """
+        buffer = self._buffers[group]
+        if buffer:
+            key = -self.sort_key(buffer[0])
+            heapq.heappush(self._heap, (key, next(self._counter), group))
+        elif self._cursors[group] is not None:
+            self._needs_fetch.add(group)
+
+    def _fetch(self):
+        """
+        Fetch the next page for every group that has run out of topics.
+
+        Nothing can be merged until these have arrived, because any of them
+        might contain the next topic.
+        """
+        if not self._needs_fetch:
+            return
+
+        groups = sorted(self._needs_fetch)
+        self._needs_fetch.clear()
+
+        def list_topics(group):
+            return self.client.list_topics(group, self._cursors[group], self.order, self.period)
+
+        metrics.incr("frontpage.fetch", len(groups))
+        pending = deque(groups)
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(groups))) as executor:
+                for data in executor.map(list_topics, groups):
+                    group = pending.popleft()
+                    self._buffers[group].extend(data["topics"])
+                    self._cursors[group] = data["last"] if data["topics"] else None
+                    self._push(group)
+        finally:
+            # If a request failed, try the remaining groups again next time
+            self._needs_fetch.update(pending)
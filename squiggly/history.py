@@ -0,0 +1,117 @@
+from itertools import count
+
+
+class ViewHistory:
+    """
+    Back and forward navigation between views, like in a web browser.
+
+    The views are kept alive along with their focus and scroll position, so
+    going back to one is instant. Views that fall off the back/forward list,
+    e.g. the previous thread after opening another one from the same
+    listing, are retained as well so they can be found with find().
+
+    To keep memory in check, only the max_entries most recently used views
+    are kept. Views also share a budget of built widgets. When it's
+    exceeded, the least recently used views throw away their widgets but
+    keep their data and focus, and the widgets are rebuilt if the view is
+    shown again.
+
+    Views must provide a built_widgets property and a release() method.
+    """
+
+    def __init__(self, max_entries=32, widget_budget=2000):
+        self.max_entries = max_entries
+        self.widget_budget = widget_budget
+        self.entries = []
+        self.position = -1
+        self._last_used = {}
+        self._clock = count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, view):
+        """
+        Whether the view is still retained, even if it's not in entries.
+        """
+        return view in self._last_used
+
+    @property
+    def current(self):
+        return self.entries[self.position] if self.entries else None
+
+    def push(self, view):
+        """
+        Show a view, discarding anything that could be reached with forward().
+
+        A view that's already in the history is moved to the top instead of
+        appearing twice.
+        """
+        if view is self.current:
+            return
+
+        # The forward entries stay retained, they're only dropped from the list
+        del self.entries[self.position + 1 :]
+        if view in self.entries:
+            self.entries.remove(view)
+        self.entries.append(view)
+        self.position = len(self.entries) - 1
+        self._touch(view)
+        self.trim()
+
+    def replace(self, old_view, new_view):
+        """
+        Swap a view for a newer version of it, keeping its place in history.
+        """
+        if old_view in self.entries:
+            self.entries[self.entries.index(old_view)] = new_view
+        if old_view in self._last_used:
+            del self._last_used[old_view]
+            self._touch(new_view)
+            self.trim()
+
+    def back(self):
+        if self.position <= 0:
+            return None
+        self.position -= 1
+        self._touch(self.current)
+        return self.current
+
+    def forward(self):
+        if self.position >= len(self.entries) - 1:
+            return None
+        self.position += 1
+        self._touch(self.current)
+        return self.current
+
+    def find(self, predicate):
+        """
+        Return the most recently used view that matches, or None.
+        """
+        views = [view for view in self._last_used if predicate(view)]
+        return max(views, key=self._last_used.get, default=None)
+
+    def trim(self):
+        current = self.current
+        while len(self._last_used) > self.max_entries:
+            oldest = min(
+                (view for view in self._last_used if view is not current),
+                key=self._last_used.get,
+            )
+            del self._last_used[oldest]
+            if oldest in self.entries:
+                index = self.entries.index(oldest)
+                del self.entries[index]
+                if index < self.position:
+                    self.position -= 1
+
+        total = sum(view.built_widgets for view in self._last_used)
+        for view in sorted(self._last_used, key=self._last_used.get):
+            if total <= self.widget_budget:
+                break
+            if view is not current:
+                total -= view.built_widgets
+                view.release()
+
+    def _touch(self, view):
+        self._last_used[view] = next(self._clock)
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+
+import urwid
+
+from squiggly.metrics import metrics
+
+
+class ThrottledMainLoop(urwid.MainLoop):
+    """
+    A MainLoop that redraws at most max_fps times per second.
+
+    urwid redraws the screen every time the event loop goes idle, which
+    with a held down key means once per repeated key. On a slow terminal or
+    over SSH the redraws can't keep up, and scrolling lags behind the
+    keyboard. Here input is still handled as soon as it arrives, but the
+    redraw is put off until the next frame is due, so a burst of movement
+    keys is drawn as a single focus change.
+
+    Work that only needs to happen once per frame, like reacting to the
+    focus moving, can be queued with coalesce() and is run right before the
+    frame is drawn.
+    """
+
+    def __init__(self, *args, max_fps=30, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frame_interval = 1 / max_fps if max_fps > 0 else 0
+        self._last_frame = None
+        self._frame_alarm = None
+        self._coalesced = OrderedDict()
+
+    def coalesce(self, key, callback, *args):
+        """
+        Call callback(*args) before the next frame is drawn.
+
+        If something is already queued with the same key, it's replaced so
+        that only the latest call is made.
+        """
+        if key in self._coalesced:
+            metrics.incr("loop.coalesced")
+            del self._coalesced[key]
+        self._coalesced[key] = (callback, args)
+
+    def entering_idle(self):
+        now = time.monotonic()
+        if self._last_frame is not None and now - self._last_frame < self.frame_interval:
+            # The alarm wakes up the event loop, which goes idle again and
+            # comes back here once the frame is due
+            if self._frame_alarm is None:
+                delay = self._last_frame + self.frame_interval - now
+                self._frame_alarm = self.set_alarm_in(delay, self._on_frame_alarm)
+            metrics.incr("loop.deferred_frames")
+            return
+
+        while self._coalesced:
+            _, (callback, args) = self._coalesced.popitem(last=False)
+            callback(*args)
+
+        self._last_frame = now
+        super().entering_idle()
+
+    def _on_frame_alarm(self, *_):
+        self._frame_alarm = None
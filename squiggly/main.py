@@ -1,16 +1,235 @@
+import argparse
 import logging
+import os
+import sys
+import time
 
 import urwid
 
+from squiggly import START_TIME, export
 from squiggly.api import Client
+from squiggly.cache import ResponseCache, default_cache_dir
+from squiggly.fetch import Fetcher, IdleStream
+from squiggly.frontpage import FrontPage
+from squiggly.loop import ThrottledMainLoop
+from squiggly.metrics import metrics
+from squiggly.pool import PooledClient
+from squiggly.prefetch import Prefetcher
+from squiggly.search import SearchIndex
+from squiggly.store import OfflineClient, SnapshotStore, default_data_dir, sync
 from squiggly.theme import palette
+from squiggly.transport import Transport
 from squiggly.views import SquigglyView
+from squiggly.widgets import EnhancedWidget
 
 logger = logging.getLogger(__name__)
 
+parser = argparse.ArgumentParser(prog="squiggly", description="A terminal interface for tildes.net")
+parser.add_argument(
+    "--page-size", type=int, default=5, help="number of topics to load per page (default: 5)"
+)
+parser.add_argument(
+    "--prefetch",
+    type=int,
+    default=2,
+    metavar="N",
+    help="maximum number of concurrent background prefetches, 0 to disable (default: 2)",
+)
+parser.add_argument(
+    "--profile-render",
+    action="store_true",
+    help="log the time spent rendering each widget class on exit",
+)
+parser.add_argument(
+    "--sync",
+    action="store_true",
+    help="download subscribed groups, topics and comments for offline use, then exit",
+)
+parser.add_argument(
+    "--sync-pages",
+    type=int,
+    default=4,
+    metavar="N",
+    help="number of topic pages to download per group when syncing (default: 4)",
+)
+parser.add_argument(
+    "--offline", action="store_true", help="browse the snapshot downloaded with --sync"
+)
+parser.add_argument(
+    "--poll",
+    type=float,
+    default=0,
+    metavar="SECONDS",
+    help="check the open topic for new comments every SECONDS, 0 to disable (default: 0)",
+)
+parser.add_argument(
+    "--processes",
+    type=int,
+    default=0,
+    metavar="N",
+    help="download and parse pages in N worker processes, 0 to use threads (default: 0)",
+)
+parser.add_argument(
+    "--history-budget",
+    type=int,
+    default=2000,
+    metavar="N",
+    help="number of list items that views in the back/forward history may keep built "
+    "before the least recently used ones are released (default: 2000)",
+)
+parser.add_argument(
+    "--max-fps",
+    type=float,
+    default=30,
+    metavar="N",
+    help="redraw the screen at most N times per second, 0 for no limit (default: 30)",
+)
+parser.add_argument(
+    "--debug",
+    metavar="PATH",
+    nargs="?",
+    const="/tmp/squiggly.log",
+    help="write debug logging to PATH (default: /tmp/squiggly.log)",
+)
+parser.add_argument(
+    "--metrics",
+    metavar="PATH",
+    help="write the counters and timings collected during the session to PATH as JSON on exit",
+)
+parser.add_argument(
+    "--profile-startup",
+    action="store_true",
+    help="print the time it took to draw the first screen, broken down by phase, on exit",
+)
+
+subparsers = parser.add_subparsers(dest="command", metavar="command")
+export_parser = subparsers.add_parser(
+    "export",
+    help="write groups, topic listings and threads to stdout as JSON Lines",
+    description="Write groups, topic listings and threads to stdout as JSON Lines.",
+)
+export_parser.add_argument(
+    "--group",
+    action="append",
+    default=[],
+    metavar="NAME",
+    help="only export this group, can be repeated (default: all groups)",
+)
+export_parser.add_argument(
+    "--pages", type=int, metavar="N", help="maximum number of listing pages per group"
+)
+export_parser.add_argument(
+    "--per-page", type=int, default=50, metavar="N", help="topics per listing page (default: 50)"
+)
+export_parser.add_argument(
+    "--no-threads", action="store_true", help="only export the listings, not the comments"
+)
+export_parser.add_argument(
+    "--workers", type=int, default=4, metavar="N", help="concurrent requests (default: 4)"
+)
+export_parser.add_argument(
+    "--checkpoint",
+    metavar="PATH",
+    help="save progress to PATH, and resume from it if it exists",
+)
+export_parser.add_argument(
+    "-q", "--quiet", action="store_true", help="don't print progress to stderr"
+)
+
+
+class StartupProfile:
+    """
+    Record how long each phase of startup takes, up until the first frame.
+
+    The imports are timed from when the squiggly package was first imported.
+    Starting the interpreter itself happens before that, and isn't included.
+    """
+
+    def __init__(self, start=START_TIME):
+        self.phases = []
+        self._last = start
+        self.mark("imports")
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        lines = [f"{phase:<24}{elapsed * 1000:8.1f} ms" for phase, elapsed in self.phases]
+        total = sum(elapsed for _, elapsed in self.phases)
+        lines.append(f"{'time to first frame':<24}{total * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+def call_after_first_frame(main_loop, callback):
+    """
+    Call the function once, right after the main loop has drawn the screen.
+
+    The main loop draws when the event loop goes idle, using an idle handler
+    that it registers when it starts. Alarms that are due run before the
+    loop goes idle, so registering our handler from a zero-delay alarm puts
+    it after the main loop's handler.
+    """
+
+    def on_idle():
+        nonlocal called
+        if called:
+            return
+        called = True
+        # The idle handlers can't be removed while urwid is calling them
+        main_loop.set_alarm_in(0, on_remove)
+        callback()
+
+    def on_remove(*_):
+        main_loop.event_loop.remove_enter_idle(handle)
+
+    def on_alarm(*_):
+        nonlocal handle
+        handle = main_loop.event_loop.enter_idle(on_idle)
+
+    handle = None
+    called = False
+    main_loop.set_alarm_in(0, on_alarm)
+
+
+def build_client(per_page, transport, processes=0, cache=None, index=None):
+    """
+    Create the client, handing requests to worker processes if any were requested.
+    """
+    if processes > 0:
+        return PooledClient(
+            cache=cache,
+            per_page=per_page,
+            processes=processes,
+            transport_options={},
+            index=index,
+        )
+    return Client(cache=cache, per_page=per_page, transport=transport, index=index)
+
 
 def main():
-    logging.basicConfig(level=logging.DEBUG, filename="/tmp/squiggly.log")
+    profile = StartupProfile()
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, filename=args.debug)
+    elif args.command == "export" or args.sync:
+        # Nothing is drawn in the terminal, so e.g. cron can collect the errors
+        logging.basicConfig(level=logging.WARNING)
+    else:
+        # Warnings and errors would otherwise be written over the UI
+        logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()])
+
+    if args.command == "export":
+        transport = Transport(pool_size=args.workers)
+        client = build_client(args.per_page, transport, args.processes)
+        try:
+            return export.main(args, client)
+        finally:
+            if isinstance(client, PooledClient):
+                client.shutdown()
+            transport.close()
 
     # Add movement using h/j/k/l to default command map
     urwid.command_map["k"] = urwid.CURSOR_UP
@@ -18,41 +237,384 @@ def main():
     urwid.command_map["h"] = urwid.CURSOR_LEFT
     urwid.command_map["l"] = urwid.CURSOR_RIGHT
 
-    client = Client()
+    cache = ResponseCache(path=os.path.join(default_cache_dir(), "responses.sqlite3"))
+    EnhancedWidget.profile_render = args.profile_render
+
+    index = SearchIndex(os.path.join(default_data_dir(), "search.sqlite3"))
 
-    view = SquigglyView()
-    view.load_group_view(client.list_groups())
+    fetcher = Fetcher()
+    transport = Transport(pool_size=fetcher.max_workers)
+    processes = 0 if args.offline else args.processes
+    client = build_client(args.page_size, transport, processes, cache=cache, index=index)
+
+    store = None
+    if args.sync or args.offline:
+        store = SnapshotStore(os.path.join(default_data_dir(), "snapshot.sqlite3"))
+
+    if args.sync:
+
+        def progress(message):
+            print(message, file=sys.stderr)
+
+        try:
+            workers = max(fetcher.max_workers, args.processes)
+            sync(client, store, pages=args.sync_pages, workers=workers, progress=progress)
+        finally:
+            fetcher.shutdown()
+            if isinstance(client, PooledClient):
+                client.shutdown()
+            transport.close()
+            store.close()
+            index.close()
+            cache.close()
+        return
+    elif args.offline:
+        client = OfflineClient(store, per_page=args.page_size)
+
+    profile.mark("setup")
+
+    view = SquigglyView(history_budget=args.history_budget)
+
+    # The requests that are displaying a loading message, by key. Prefetches
+    # and other background jobs share the fetcher but don't show up here.
+    loading = {}
+
+    def fetch(key, message, callback, func, *args):
+        """
+        Run a client call in the background while displaying a loading message.
+
+        Navigation requests share the same key, so e.g. selecting a new group
+        while a topic is still loading will cancel the topic request.
+        """
+
+        def on_result(data):
+            loading.pop(key, None)
+            if all(request.cancelled for request in loading.values()):
+                view.set_status()
+            callback(data)
+
+        def on_error(error):
+            loading.pop(key, None)
+            logger.error("Error fetching data", exc_info=error)
+            view.set_status(f"Error: {error}")
+
+        view.set_loading(message)
+        loading[key] = fetcher.submit(func, *args, key=key, callback=on_result, errback=on_error)
+
+    def show_topic_view(group):
+        """
+        Switch to the listing if it's still in the history, and is no older
+        than the client would cache it for.
+        """
+        topic_listbox = view.find_topic_view(group)
+        if topic_listbox is None:
+            return False
+        if time.monotonic() - topic_listbox.loaded_at > Client.list_topics.ttl:
+            return False
+
+        view.show(topic_listbox)
+        return True
 
     def on_select_group(group_item):
-        name = group_item.data["name"]
-        data = client.list_topics(name)
-        view.load_topic_view(data)
+        name = group_item.data.name
+        if show_topic_view(name):
+            return
+
+        fetch("navigate", f"Loading {name}...", view.load_topic_view, client.list_topics, name)
+
+    def open_front_page():
+        """
+        Start a front page merged from the subscribed groups, or from every
+        group if the client isn't subscribed to anything.
+        """
+        groups = client.list_groups()["groups"]
+        subscribed = [group for group in groups if group.subscribed] or groups
+        front_page = FrontPage(
+            client, [group.name for group in subscribed], workers=fetcher.max_workers
+        )
+        return front_page.next_page()
+
+    def on_front_page(*_):
+        if show_topic_view("subscribed"):
+            return
+
+        fetch("navigate", "Loading subscribed groups...", view.load_topic_view, open_front_page)
 
     def on_topic_more(topic_listbox):
+        front_page = topic_listbox.data.get("feed")
+        if front_page is not None:
+            fetch(
+                "more",
+                "Loading more topics...",
+                topic_listbox.load_more,
+                front_page.next_page,
+                topic_listbox.data["last"],
+            )
+            return
+
         group = topic_listbox.data["group"]
         after = topic_listbox.data["last"]
         order = topic_listbox.data["order"]
         period = topic_listbox.data["period"]
-        data = client.list_topics(group, after, order, period)
-        topic_listbox.load_more(data)
+        fetch(
+            "more",
+            "Loading more topics...",
+            topic_listbox.load_more,
+            client.list_topics,
+            group,
+            after,
+            order,
+            period,
+        )
 
-    def on_topic_select(topic_listbox):
-        topic_id = topic_listbox.data["id36"]
-        data = client.get_topic(topic_id)
-        view.load_comment_view(data)
+    # The comment threads that are still streaming in, and their streams
+    streams = {}
+
+    def open_topic(topic_id):
+        """
+        Download the topic on a worker thread, leaving the comments to be
+        parsed as they're streamed into the view.
+        """
+        comments = client.iter_topic(topic_id, store=store_topic)
+        return next(comments), comments
+
+    def store_topic(topic):
+        # Called from the last streamed batch, keep the UI thread free
+        fetcher.submit(client.store_topic, topic)
+
+    def on_topic_fetched(topic):
+        # Stream the comments in all the same, they still need to be laid out
+        on_topic_open((topic._replace(comments=[]), iter(topic.comments)))
+
+    def on_topic_open(result):
+        topic, comments = result
+        view.load_comment_view(topic)
+        comment_listbox = view.comment_view
+        comment_listbox.complete = False
+
+        def on_batch(batch):
+            if comment_listbox not in view.history:
+                # The thread was evicted from the history, nobody can see it
+                cancel_stream(comment_listbox)
+                return
+            comment_listbox.append(batch)
+
+        def on_error(error):
+            streams.pop(comment_listbox, None)
+            logger.error("Error streaming comments", exc_info=error)
+            view.set_status(f"Error: {error}")
+
+        def on_done():
+            streams.pop(comment_listbox, None)
+            comment_listbox.complete = True
+
+        # Fill the first screen before it's drawn, then stream in the rest.
+        # The stream keeps going if the user opens another thread meanwhile.
+        stream = IdleStream(main_loop, comments, on_batch, on_error, on_done)
+        streams[comment_listbox] = stream
+        stream.start(first_batch=main_loop.screen.get_cols_rows()[1])
+
+    def cancel_stream(comment_listbox):
+        """
+        Stop streaming comments into the thread. It stays incomplete, so it
+        won't be reused when the topic is opened again.
+        """
+        stream = streams.pop(comment_listbox, None)
+        if stream is not None:
+            stream.cancel()
+
+    def show_comment_view(topic_id):
+        """
+        Switch to the thread if it's still in the history, and was loaded fully.
+        """
+        comment_listbox = view.find_comment_view(topic_id)
+        if comment_listbox is None or not comment_listbox.complete:
+            return False
+
+        view.show(comment_listbox)
+        return True
+
+    def on_topic_select(topic_item):
+        topic_id = topic_item.data.id36
+        if show_comment_view(topic_id):
+            return
+
+        if fetcher.in_flight(client.get_topic, topic_id):
+            # The topic is being prefetched, wait for it instead of downloading it again
+            fetch("navigate", "Loading topic...", on_topic_fetched, client.get_topic, topic_id)
+            return
+
+        fetch("navigate", "Loading topic...", on_topic_open, open_topic, topic_id)
+
+    def on_comment_refresh(comment_listbox, quiet=False):
+        if comment_listbox in streams:
+            # The thread is still loading, there's nothing to refresh yet
+            return
+
+        topic_id = comment_listbox.data.id36
+
+        def on_result(data):
+            changed = comment_listbox.refresh(data)
+            if not quiet or changed:
+                view.set_status(f"{changed} new or updated comments")
+
+        if quiet:
+            fetcher.submit(client.refresh_topic, topic_id, key="refresh", callback=on_result)
+        else:
+            fetch(
+                "refresh", "Checking for new comments...", on_result, client.refresh_topic, topic_id
+            )
+
+    def on_poll(*_):
+        comment_view = view.comment_view
+        if view.frame.body is comment_view and comment_view.data is not None:
+            on_comment_refresh(comment_view, quiet=True)
+        main_loop.set_alarm_in(args.poll, on_poll)
+
+    search_alarm = None
+
+    def search(query):
+        with metrics.timer("search.query"):
+            return query, index.search(query)
+
+    def on_search_alarm(_, search_listbox):
+        nonlocal search_alarm
+        search_alarm = None
+        query = search_listbox.data["query"]
+        fetcher.submit(
+            search,
+            query,
+            key="search",
+            callback=lambda result: search_listbox.set_results(*result),
+        )
+
+    def on_search(search_listbox):
+        # Wait for a pause in typing instead of searching on every keystroke
+        nonlocal search_alarm
+        if search_alarm is not None:
+            main_loop.remove_alarm(search_alarm)
+        search_alarm = main_loop.set_alarm_in(0.15, on_search_alarm, search_listbox)
+
+    def on_search_select(result_item):
+        result = result_item.data
+
+        def on_result(topic):
+            view.load_comment_view(topic)
+            if result.comment_id is not None:
+                view.comment_view.focus_comment(result.comment_id)
+
+        if show_comment_view(result.topic_id):
+            if result.comment_id is not None:
+                view.comment_view.focus_comment(result.comment_id)
+            return
+
+        fetch("navigate", "Loading topic...", on_result, client.get_topic, result.topic_id)
+
+    stats_alarm = None
+
+    def on_stats_tick(*_):
+        nonlocal stats_alarm
+        stats_alarm = None
+        if view.stats_visible:
+            view.update_stats()
+            stats_alarm = main_loop.set_alarm_in(1, on_stats_tick)
+
+    def on_stats_toggle(*_):
+        if stats_alarm is None:
+            on_stats_tick()
+
+    def on_close(*_):
+        # A thread that's still streaming in keeps going, it's in the history
+        # and may be reused once it's complete
+        fetcher.cancel("navigate")
+        fetcher.cancel("more")
+        fetcher.cancel("refresh")
+        loading.clear()
+        view.set_status()
+
+    def on_cancel(*_):
+        if view.frame.body is view.comment_view:
+            cancel_stream(view.comment_view)
+        on_close()
 
     view.connect_signal("group_select", on_select_group)
     view.connect_signal("topic_more", on_topic_more)
     view.connect_signal("topic_select", on_topic_select)
+    view.connect_signal("comment_refresh", on_comment_refresh)
+    view.connect_signal("topic_close", on_close)
+    view.connect_signal("comment_close", on_close)
+    view.connect_signal("cancel", on_cancel)
+    view.connect_signal("stats_toggle", on_stats_toggle)
+    view.connect_signal("search", on_search)
+    view.connect_signal("search_select", on_search_select)
+    view.connect_signal("front_page", on_front_page)
+    profile.mark("view")
+
+    # Paint whatever groups we saw last time straight away, and refresh them
+    # once the first frame is on the screen
+    cached_groups = client.get_cached("list_groups")
+    if cached_groups is not None:
+        view.load_group_view(cached_groups)
+    else:
+        view.set_loading("Loading groups...")
+    profile.mark("cached groups")
+
+    def on_groups(data):
+        if data != cached_groups:
+            view.load_group_view(data)
+
+    def on_first_frame():
+        profile.mark("first frame")
+        fetch("groups", "Loading groups...", on_groups, client.list_groups)
 
     event_loop = urwid.SelectEventLoop()
-    main_loop = urwid.MainLoop(view, palette, event_loop=event_loop)
+    main_loop = ThrottledMainLoop(view, palette, event_loop=event_loop, max_fps=args.max_fps)
+    fetcher.attach(main_loop)
+
+    if args.poll > 0:
+        main_loop.set_alarm_in(args.poll, on_poll)
+
+    if args.prefetch > 0:
+        prefetcher = Prefetcher(client, fetcher, main_loop, max_concurrent=args.prefetch)
+        # Holding down j/k moves the focus many times per frame, only the
+        # position it ends up at is worth prefetching for
+        view.connect_signal(
+            "topic_focus",
+            lambda topic_listbox: main_loop.coalesce(
+                "topic_focus", prefetcher.on_topic_focus, topic_listbox
+            ),
+        )
+
+    call_after_first_frame(main_loop, on_first_frame)
 
     try:
         main_loop.run()
     except KeyboardInterrupt:
         pass
+    finally:
+        fetcher.shutdown()
+        if isinstance(client, PooledClient):
+            client.shutdown()
+        logger.info(f"Response cache stats: {cache.stats()}")
+        logger.info(f"Transport stats: {transport.stats()}")
+        transport.close()
+        if store is not None:
+            store.close()
+        index.close()
+        cache.close()
+        if args.profile_render:
+            for name, stats in EnhancedWidget.render_stats().items():
+                logger.info(f"Render stats for {name}: {stats}")
+        if args.profile_startup:
+            print(profile.report(), file=sys.stderr)
+        if args.metrics:
+            metrics.dump(
+                args.metrics,
+                cache=cache.stats(),
+                transport=transport.stats(),
+                startup=dict(profile.phases),
+            )
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
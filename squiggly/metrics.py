@@ -0,0 +1,159 @@
+"""
+Lightweight counters and timing histograms for the hot paths.
+
+Everything is recorded into the module-level registry, e.g.
+
+    metrics.incr("cache.hit")
+    with metrics.timer("client.get_topic.fetch"):
+        ...
+
+Recording is cheap enough to leave on in production. The current values
+can be shown with the stats overlay in the UI or written to a JSON file
+on exit with --metrics.
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets in seconds, from 10us to ~80s
+BUCKETS = [0.00001 * 2**i for i in range(24)]
+
+
+class Histogram:
+    """
+    Track the distribution of a timing in power-of-two buckets.
+
+    The count, total, min and max are exact. Percentiles are estimated from
+    the bucket boundaries, which is good enough to tell 1ms from 100ms.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+            self.buckets[bisect_left(BUCKETS, value)] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """
+        Return the upper bound of the bucket containing the q-th percentile.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.mean,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+        }
+
+
+class Metrics:
+    """
+    A registry of named counters and histograms.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, value):
+        self.histogram(name).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Record the time spent inside of the context, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {
+                name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())
+            },
+        }
+
+    def format(self):
+        """
+        Return a plain text table of the current values, for the stats overlay.
+        """
+        lines = []
+        histograms = sorted(self.histograms.items())
+        if histograms:
+            lines.append(f"{'timing (ms)':<32}{'count':>7}{'mean':>8}{'p95':>8}{'max':>8}")
+        for name, histogram in histograms:
+            s = histogram.snapshot()
+            lines.append(
+                f"{name:<32}{s['count']:>7}{s['mean'] * 1000:>8.2f}"
+                f"{s['p95'] * 1000:>8.2f}{s['max'] * 1000:>8.2f}"
+            )
+        if lines:
+            lines.append("")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:<32}{value:>7}")
+        return "\n".join(lines) or "No metrics recorded yet"
+
+    def dump(self, path, **extra):
+        """
+        Write the current values to a JSON file, along with any extra data.
+        """
+        data = self.snapshot()
+        data.update(extra)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+metrics = Metrics()
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from squiggly.api import Client, cached
+
+# The client used by each worker process, see init_worker()
+worker_client = None
+
+
+def init_worker(per_page, tildes_client_factory, transport_options):
+    global worker_client
+
+    tildes_client = tildes_client_factory() if tildes_client_factory is not None else None
+    transport = None
+    if transport_options is not None:
+        from squiggly.transport import Transport
+
+        transport = Transport(**transport_options)
+
+    worker_client = Client(per_page=per_page, tildes_client=tildes_client, transport=transport)
+
+
+def call_worker(method, *args):
+    return getattr(worker_client, method)(*args)
+
+
+class PooledClient(Client):
+    """
+    A Client that downloads and parses pages in a pool of worker processes.
+
+    tildee's HTML parsing and our own parsing are pure Python, so on the
+    thread pool they all share one core with the UI. Here every request is
+    handed to a worker process, which returns plain records that are cheap
+    to pickle. Concurrent requests, e.g. from the prefetcher or a sync,
+    fan out across cores.
+
+    Responses are still cached in this process. The workers don't keep a
+    cache of their own, so expired entries are fetched again in full rather
+    than revalidated with a conditional request. Each worker has its own
+    transport, the request rate is divided between them.
+    """
+
+    def __init__(
+        self,
+        cache=None,
+        per_page=5,
+        processes=None,
+        tildes_client_factory=None,
+        transport_options=None,
+        index=None,
+    ):
+        super().__init__(cache=cache, per_page=per_page, index=index)
+        self.processes = processes or os.cpu_count() or 1
+
+        if transport_options is not None:
+            transport_options = dict(transport_options)
+            transport_options["rate"] = transport_options.get("rate", 2.0) / self.processes
+            transport_options["pool_size"] = 1
+
+        # Don't fork, the parent process is running threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(per_page, tildes_client_factory, transport_options),
+        )
+
+    def _call(self, method, *args):
+        return self._executor.submit(call_worker, method, *args).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    @cached(ttl=Client.list_groups.ttl)
+    def list_groups(self):
+        return self._call("list_groups")
+
+    @cached(ttl=Client.list_topics.ttl, params=("per_page",))
+    def list_topics(self, group="", after="", order="", period=""):
+        data = self._call("list_topics", group, after, order, period)
+        if self.index is not None:
+            self.index.add_topics_later(data["topics"])
+        return data
+
+    @cached(ttl=Client.get_topic.ttl)
+    def get_topic(self, topic_id):
+        topic = self._call("get_topic", topic_id)
+        if self.index is not None:
+            self.index.add_topic_later(topic)
+        return topic
+
+    def iter_topic(self, topic_id, store=None):
+        # The comments have already been parsed by the worker
+        topic = self.get_topic(topic_id)
+        yield topic._replace(comments=[])
+        yield from topic.comments
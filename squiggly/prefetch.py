@@ -0,0 +1,70 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Warm the client cache with data that the user is likely to ask for next.
+
+    When the focus in a topic listing gets close to the end of the list, the
+    next page is fetched in the background. When the focus rests on a topic
+    for a little while, the topic's comments are fetched. The results are
+    thrown away here, the point is that the client cache will already have
+    them when the user actually selects the item.
+    """
+
+    def __init__(self, client, fetcher, main_loop, threshold=3, dwell=0.5, max_concurrent=2):
+        self.client = client
+        self.fetcher = fetcher
+        self.main_loop = main_loop
+        self.threshold = threshold
+        self.dwell = dwell
+        self.max_concurrent = max_concurrent
+
+        self._inflight = set()
+        self._alarm = None
+
+    def on_topic_focus(self, topic_listbox):
+        self.cancel_dwell()
+
+        data = topic_listbox.data
+        # The next page of a merged front page depends on what's been merged
+        # so far, so it can't be fetched ahead of time
+        near_end = topic_listbox.items_below_focus < self.threshold
+        if data.get("last") and "feed" not in data and near_end:
+            args = (data["group"], data["last"], data["order"], data["period"])
+            self.prefetch(("topics", *args), self.client.list_topics, *args)
+
+        topic = topic_listbox.focus_topic
+        if topic is not None:
+            self._alarm = self.main_loop.set_alarm_in(
+                self.dwell, lambda *_: self.prefetch_topic(topic.id36)
+            )
+
+    def prefetch_topic(self, topic_id):
+        self._alarm = None
+        self.prefetch(("topic", topic_id), self.client.get_topic, topic_id)
+
+    def cancel_dwell(self):
+        if self._alarm is not None:
+            self.main_loop.remove_alarm(self._alarm)
+            self._alarm = None
+
+    def prefetch(self, key, func, *args):
+        """
+        Submit a background fetch, unless the same fetch is already running or
+        there are too many prefetches running already.
+        """
+        if key in self._inflight or len(self._inflight) >= self.max_concurrent:
+            return
+
+        def on_done(*_):
+            self._inflight.discard(key)
+
+        def on_error(error):
+            logger.info(f"Prefetch {key} failed: {error}")
+            self._inflight.discard(key)
+
+        self._inflight.add(key)
+        self.fetcher.submit(func, *args, key=("prefetch", *key), callback=on_done, errback=on_error)
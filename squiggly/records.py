@@ -0,0 +1,51 @@
+"""
+Compact record types for the data returned by the api client.
+
+Long sessions hold on to thousands of topics and comments, so these are
+namedtuples rather than dicts. A namedtuple has no per-instance __dict__
+and takes a fraction of the memory of a dict with the same fields.
+"""
+from collections import namedtuple
+
+Group = namedtuple("Group", ["name", "desc", "num_subscribers", "subscribed"])
+
+PartialTopic = namedtuple(
+    "PartialTopic",
+    [
+        "id36",
+        "group",
+        "author",
+        "title",
+        "link",
+        "content",
+        "num_comments",
+        "num_votes",
+        "timestamp",
+    ],
+)
+
+Topic = namedtuple(
+    "Topic",
+    [
+        "id36",
+        "group",
+        "author",
+        "title",
+        "link",
+        "content",
+        "num_comments",
+        "num_votes",
+        "timestamp",
+        "is_locked",
+        "tags",
+        "comments",
+    ],
+)
+
+Comment = namedtuple(
+    "Comment", ["id36", "parent_id", "level", "author", "content", "status", "timestamp"]
+)
+
+SearchResult = namedtuple(
+    "SearchResult", ["topic_id", "comment_id", "group", "title", "author", "snippet"]
+)
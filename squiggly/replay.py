@@ -0,0 +1,328 @@
+"""
+Replay a scripted navigation session against a headless screen.
+
+The view is driven by the same signals as in the real UI, but the data
+comes from a JSON fixture file instead of the network, and every frame is
+drawn synchronously so that its timing is deterministic. Fixtures can be
+recorded from the live site with --record.
+
+    squiggly-bench --record session.json
+    squiggly-bench session.json --output frames.json
+    squiggly-bench session.json --compare frames.json
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import urwid
+
+from squiggly.export import to_json
+from squiggly.records import Comment, Group, PartialTopic, Topic
+from squiggly.theme import palette
+from squiggly.views import SquigglyView
+
+# Open a group, scroll to the end of the listing, open the last topic and
+# page through its comments
+DEFAULT_SCRIPT = "enter, down*500, up, enter, page down*50"
+
+parser = argparse.ArgumentParser(
+    prog="squiggly-bench",
+    description=__doc__,
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+)
+parser.add_argument("fixtures", help="JSON fixture file to replay, or to write with --record")
+parser.add_argument(
+    "--script",
+    default=DEFAULT_SCRIPT,
+    help="comma separated keys to press, with an optional *N to repeat a key "
+    f'(default: "{DEFAULT_SCRIPT}")',
+)
+parser.add_argument(
+    "--size",
+    default="150x50",
+    metavar="COLSxROWS",
+    help="size of the headless screen (default: 150x50)",
+)
+parser.add_argument(
+    "--record",
+    action="store_true",
+    help="run the script against the live site and save the responses as fixtures",
+)
+parser.add_argument(
+    "--per-page",
+    type=int,
+    default=50,
+    metavar="N",
+    help="number of topics per listing page when recording (default: 50)",
+)
+parser.add_argument("-o", "--output", metavar="PATH", help="write every frame as JSON to PATH")
+parser.add_argument(
+    "-c",
+    "--compare",
+    metavar="PATH",
+    help="compare against frames written with --output, and exit with an error on regressions",
+)
+parser.add_argument(
+    "--threshold",
+    type=float,
+    default=1.5,
+    metavar="RATIO",
+    help="how many times slower the p95 frame time of a key may get with --compare "
+    "(default: 1.5)",
+)
+
+
+class HeadlessScreen(urwid.BaseScreen):
+    """
+    A screen that fully materializes every canvas but never writes anywhere.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+        self.register_palette(palette)
+
+    def get_cols_rows(self):
+        return self.size
+
+    def draw_screen(self, size, canvas):
+        return [list(row) for row in canvas.content()]
+
+
+def decode_timestamp(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def decode_topic(data):
+    data = dict(data, timestamp=decode_timestamp(data["timestamp"]))
+    if "comments" not in data:
+        return PartialTopic(**data)
+
+    comments = [
+        Comment(**dict(comment, timestamp=decode_timestamp(comment["timestamp"])))
+        for comment in data["comments"]
+    ]
+    return Topic(**dict(data, comments=comments))
+
+
+def listing_key(group="", after="", order="", period=""):
+    return "|".join((group, after or "", order, period))
+
+
+class ReplayClient:
+    """
+    A stand-in for Client that serves responses from a fixture file.
+
+    Listings that weren't recorded are served as empty, the same as the end
+    of a listing on the site.
+    """
+
+    def __init__(self, fixtures, per_page=5):
+        self.per_page = per_page
+        self.groups = {"groups": [Group(**group) for group in fixtures["groups"]]}
+        self.listings = {}
+        for key, data in fixtures["listings"].items():
+            self.listings[key] = dict(data, topics=[decode_topic(t) for t in data["topics"]])
+        self.topics = {key: decode_topic(data) for key, data in fixtures["topics"].items()}
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def list_groups(self):
+        return self.groups
+
+    def list_topics(self, group="", after="", order="", period=""):
+        data = self.listings.get(listing_key(group, after, order, period))
+        if data is None:
+            data = {"group": group, "after": after, "order": order, "period": period}
+            data.update(last=None, topics=[])
+        # The view extends the list of topics in place
+        return dict(data, topics=list(data["topics"]))
+
+    def get_topic(self, topic_id):
+        return self.topics[topic_id]
+
+
+class RecordingClient:
+    """
+    Wrap a Client and keep everything it returns, to be saved as fixtures.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.per_page = client.per_page
+        self.fixtures = {"groups": [], "listings": {}, "topics": {}}
+
+    def list_groups(self):
+        data = self.client.list_groups()
+        self.fixtures["groups"] = to_json(data["groups"])
+        return data
+
+    def list_topics(self, group="", after="", order="", period=""):
+        data = self.client.list_topics(group, after, order, period)
+        self.fixtures["listings"][listing_key(group, after, order, period)] = to_json(data)
+        return dict(data, topics=list(data["topics"]))
+
+    def get_topic(self, topic_id):
+        topic = self.client.get_topic(topic_id)
+        self.fixtures["topics"][topic_id] = to_json(topic)
+        return topic
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.fixtures, f)
+
+
+def parse_script(script):
+    """
+    Turn "enter, down*3" into ["enter", "down", "down", "down"].
+    """
+    keys = []
+    for step in script.split(","):
+        key, _, repeat = step.strip().partition("*")
+        keys.extend([key.strip()] * int(repeat or 1))
+    return [key for key in keys if key]
+
+
+class Session:
+    """
+    A SquigglyView connected to a client, with every request made inline.
+    """
+
+    def __init__(self, client, size):
+        self.client = client
+        self.size = size
+        self.screen = HeadlessScreen(size)
+        self.view = SquigglyView()
+        self.view.connect_signal("group_select", self.on_group_select)
+        self.view.connect_signal("topic_select", self.on_topic_select)
+        self.view.connect_signal("topic_more", self.on_topic_more)
+        self.view.load_group_view(client.list_groups())
+
+    def on_group_select(self, group_item):
+        self.view.load_topic_view(self.client.list_topics(group_item.data.name))
+
+    def on_topic_select(self, topic_item):
+        self.view.load_comment_view(self.client.get_topic(topic_item.data.id36))
+
+    def on_topic_more(self, topic_listbox):
+        data = topic_listbox.data
+        data = self.client.list_topics(data["group"], data["last"], data["order"], data["period"])
+        topic_listbox.load_more(data)
+
+    def frame(self, key=None):
+        """
+        Press a key and draw the screen, returning the timings for the frame.
+        """
+        start = time.perf_counter()
+        if key is not None:
+            self.view.keypress(self.size, key)
+        handled = time.perf_counter()
+        canvas = self.view.render(self.size, focus=True)
+        rendered = time.perf_counter()
+        self.screen.draw_screen(self.size, canvas)
+        drawn = time.perf_counter()
+
+        return {
+            "key": key,
+            "input": handled - start,
+            "render": rendered - handled,
+            "draw": drawn - rendered,
+            "total": drawn - start,
+            "canvas": [canvas.cols(), canvas.rows()],
+            "view": type(self.view.frame.body).__name__,
+        }
+
+    def run(self, keys):
+        frames = [self.frame()]
+        for key in keys:
+            frames.append(self.frame(key))
+        return frames
+
+
+def summarize(frames):
+    """
+    Return the count, mean, p95 and max frame time for each key.
+    """
+    times = {}
+    for frame in frames:
+        times.setdefault(frame["key"] or "first frame", []).append(frame["total"])
+
+    stats = {}
+    for key, values in times.items():
+        values.sort()
+        stats[key] = {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1],
+        }
+    return stats
+
+
+def report(stats, baseline=None):
+    lines = [f"{'key':<16}{'frames':>7}{'mean':>9}{'p95':>9}{'max':>9}  (ms)"]
+    for key, s in stats.items():
+        line = (
+            f"{key:<16}{s['count']:>7}{s['mean'] * 1000:>9.2f}"
+            f"{s['p95'] * 1000:>9.2f}{s['max'] * 1000:>9.2f}"
+        )
+        if baseline and key in baseline:
+            line += f"  ({s['p95'] / baseline[key]['p95']:.2f}x p95)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def find_regressions(stats, baseline, threshold):
+    """
+    Return the keys whose p95 frame time grew by more than threshold times.
+    """
+    regressions = []
+    for key, s in stats.items():
+        if key in baseline and s["p95"] > baseline[key]["p95"] * threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+    cols, rows = (int(value) for value in args.size.lower().split("x"))
+    keys = parse_script(args.script)
+
+    if args.record:
+        from squiggly.api import Client
+
+        client = RecordingClient(Client(per_page=args.per_page))
+    else:
+        client = ReplayClient.load(args.fixtures)
+
+    frames = Session(client, (cols, rows)).run(keys)
+    if args.record:
+        client.save(args.fixtures)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = summarize(json.load(f)["frames"])
+
+    stats = summarize(frames)
+    print(report(stats, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"script": args.script, "size": [cols, rows], "frames": frames}, f)
+
+    if baseline:
+        regressions = find_regressions(stats, baseline, args.threshold)
+        if regressions:
+            print(f"Frame time regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
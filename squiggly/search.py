@@ -0,0 +1,225 @@
+import html
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from squiggly.records import SearchResult
+
+logger = logging.getLogger(__name__)
+
+TAGS = re.compile(r"<[^>]+>")
+WORDS = re.compile(r"\w+", re.UNICODE)
+
+
+def strip_html(content):
+    return html.unescape(TAGS.sub(" ", content or ""))
+
+
+def build_query(text):
+    """
+    Turn what the user typed into an FTS5 query.
+
+    Every word has to match, and the last word is treated as a prefix so
+    that results show up while it's still being typed. Anything that isn't
+    a word is dropped, so the user never sees an FTS5 syntax error.
+    """
+    words = WORDS.findall(text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    # Single character prefixes match nearly everything and are slow to expand
+    if text[-1:].isalnum() and len(words[-1]) > 1:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """
+    A full-text index of the topics and comments that have been downloaded.
+
+    Backed by an sqlite FTS5 table, with a second table that maps the id36
+    of every topic and comment to its row so that indexing the same item
+    again replaces the old row. Rows are numbered in the order that they
+    were indexed.
+
+    Results are ranked with bm25, with matches in topic titles weighted
+    the highest. Ranking has to score every matching row, so for common
+    words only the most recently indexed candidates are ranked, which keeps
+    queries interactive no matter how large the index grows.
+
+    Indexing a long thread takes a while, so the clients hand topics to
+    the index's own writer thread with add_topics_later() and
+    add_topic_later() rather than waiting for them to be written.
+    """
+
+    schema = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+            topic_id UNINDEXED,
+            comment_id UNINDEXED,
+            group_name UNINDEXED,
+            topic_title UNINDEXED,
+            title,
+            author,
+            body,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        );
+        CREATE TABLE IF NOT EXISTS document_ids (
+            key TEXT PRIMARY KEY,
+            docid INTEGER NOT NULL
+        );
+    """
+
+    # bm25() weights, one for every column of the table in order
+    weights = (0, 0, 0, 0, 10.0, 2.0, 1.0)
+
+    # The number of most recently indexed matches that are ranked
+    candidates = 2000
+
+    def __init__(self, path=None):
+        if path is not None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript(self.schema)
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+        if path is not None:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._reader = sqlite3.connect(path, check_same_thread=False)
+            self._read_lock = threading.Lock()
+        else:
+            # An in-memory database can't be opened a second time
+            self._reader = self._db
+            self._read_lock = self._lock
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        # Finish writing whatever has been queued
+        self._writer.shutdown()
+        if self._reader is not self._db:
+            self._reader.close()
+        self._db.close()
+
+    def add_topics(self, topics):
+        """
+        Index topics from a listing, without their comments.
+        """
+        rows = [
+            (
+                f"t:{topic.id36}",
+                topic.id36,
+                None,
+                topic.group,
+                topic.title,
+                topic.title,
+                topic.author,
+                strip_html(topic.content),
+            )
+            for topic in topics
+        ]
+        self._insert(rows)
+
+    def add_topic(self, topic):
+        """
+        Index a topic along with all of its comments.
+        """
+        self.add_topics([topic])
+        rows = [
+            (
+                f"c:{comment.id36}",
+                topic.id36,
+                comment.id36,
+                topic.group,
+                topic.title,
+                "",
+                comment.author,
+                strip_html(comment.content),
+            )
+            for comment in topic.comments
+        ]
+        self._insert(rows)
+
+    def add_topics_later(self, topics):
+        self._later(self.add_topics, topics)
+
+    def add_topic_later(self, topic):
+        self._later(self.add_topic, topic)
+
+    def _later(self, func, *args):
+        future = self._writer.submit(func, *args)
+        future.add_done_callback(self._on_written)
+
+    @staticmethod
+    def _on_written(future):
+        error = future.exception()
+        if error is not None:
+            logger.error("Unable to index topics", exc_info=error)
+
+    def _insert(self, rows):
+        with self._lock, self._db:
+            for key, *values in rows:
+                row = self._db.execute(
+                    "SELECT docid FROM document_ids WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("DELETE FROM documents WHERE rowid = ?", row)
+
+                cursor = self._db.execute(
+                    "INSERT INTO documents "
+                    "(topic_id, comment_id, group_name, topic_title, title, author, body) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    values,
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO document_ids (key, docid) VALUES (?, ?)",
+                    (key, cursor.lastrowid),
+                )
+
+    def search(self, text, limit=50):
+        """
+        Return the best matches for the text, at most limit of them.
+        """
+        query = build_query(text)
+        if query is None:
+            return []
+
+        weights = ", ".join(str(weight) for weight in self.weights)
+        with self._read_lock:
+            try:
+                # FTS5 can walk the matches newest first and stop early, which
+                # makes finding the oldest candidate cheap
+                row = self._reader.execute(
+                    "SELECT min(rowid) FROM (SELECT rowid FROM documents "
+                    "WHERE documents MATCH ? ORDER BY rowid DESC LIMIT ?)",
+                    (query, self.candidates),
+                ).fetchone()
+                ranked = [
+                    rowid
+                    for rowid, in self._reader.execute(
+                        "SELECT rowid FROM documents WHERE documents MATCH ? AND rowid >= ? "
+                        f"ORDER BY bm25(documents, {weights}) LIMIT ?",
+                        (query, row[0] or 0, limit),
+                    )
+                ]
+                # Making a snippet is slow, so they're only made for the rows
+                # that are returned, once the ranking is known
+                rows = self._reader.execute(
+                    "SELECT rowid, topic_id, comment_id, group_name, topic_title, author, "
+                    "snippet(documents, 6, '', '', '...', 16) "
+                    "FROM documents WHERE documents MATCH ? "
+                    f"AND rowid IN ({', '.join('?' * len(ranked))})",
+                    (query, *ranked),
+                )
+                results = {rowid: SearchResult(*values) for rowid, *values in rows}
+            except sqlite3.OperationalError:
+                logger.exception(f"Invalid search query {query!r}")
+                return []
+        return [results[rowid] for rowid in ranked]
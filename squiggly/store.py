@@ -0,0 +1,200 @@
+import logging
+import os
+import pickle
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def default_data_dir():
+    """
+    Return the directory that squiggly should use for persistent data.
+    """
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(data_home, "squiggly")
+
+
+def pack(record):
+    return zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def unpack(blob):
+    return pickle.loads(zlib.decompress(blob))
+
+
+class SnapshotStore:
+    """
+    A local sqlite snapshot of groups, topic listings and comment threads.
+
+    Records are stored as compressed pickles. Topic listings are indexed by
+    (group, timestamp) so that a page of a group can be read with a single
+    index range scan.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS groups (
+            name TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS topics (
+            id36 TEXT PRIMARY KEY,
+            group_name TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS topics_group_timestamp
+            ON topics (group_name, timestamp, id36);
+        CREATE TABLE IF NOT EXISTS threads (
+            id36 TEXT PRIMARY KEY,
+            data BLOB NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(self.schema)
+
+    def close(self):
+        self._db.close()
+
+    def save_groups(self, groups):
+        with self._db:
+            self._db.execute("DELETE FROM groups")
+            self._db.executemany(
+                "INSERT INTO groups (name, data) VALUES (?, ?)",
+                [(group.name, pack(group)) for group in groups],
+            )
+
+    def save_topics(self, group, topics):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO topics (id36, group_name, timestamp, data) "
+                "VALUES (?, ?, ?, ?)",
+                [(t.id36, group, self.sort_key(t), pack(t)) for t in topics],
+            )
+
+    def save_thread(self, topic):
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO threads (id36, data) VALUES (?, ?)",
+                (topic.id36, pack(topic)),
+            )
+
+    def load_groups(self):
+        rows = self._db.execute("SELECT data FROM groups ORDER BY name")
+        return [unpack(data) for data, in rows]
+
+    def load_topics(self, group, after="", limit=5):
+        """
+        Load a page of topics for the group, newest first.
+        """
+        row = None
+        if after:
+            row = self._db.execute("SELECT timestamp FROM topics WHERE id36 = ?", (after,))
+            row = row.fetchone()
+
+        if row is not None:
+            rows = self._db.execute(
+                "SELECT data FROM topics WHERE group_name = ? "
+                "AND (timestamp < ? OR (timestamp = ? AND id36 < ?)) "
+                "ORDER BY timestamp DESC, id36 DESC LIMIT ?",
+                (group, row[0], row[0], after, limit),
+            )
+        else:
+            rows = self._db.execute(
+                "SELECT data FROM topics WHERE group_name = ? "
+                "ORDER BY timestamp DESC, id36 DESC LIMIT ?",
+                (group, limit),
+            )
+        return [unpack(data) for data, in rows]
+
+    def load_thread(self, topic_id):
+        row = self._db.execute("SELECT data FROM threads WHERE id36 = ?", (topic_id,)).fetchone()
+        return unpack(row[0]) if row else None
+
+    @staticmethod
+    def sort_key(topic):
+        return topic.timestamp.timestamp() if topic.timestamp else 0.0
+
+
+class OfflineClient:
+    """
+    Serve the same data as squiggly.api.Client from a SnapshotStore.
+
+    Topic listings are always sorted newest first, the order and period
+    arguments are accepted for compatibility but ignored.
+    """
+
+    def __init__(self, store, per_page=5):
+        self.store = store
+        self.per_page = per_page
+
+    def list_groups(self):
+        return {"groups": self.store.load_groups()}
+
+    def list_topics(self, group="", after="", order="", period=""):
+        topics = self.store.load_topics(group, after, self.per_page)
+
+        data = {}
+        data["group"] = group
+        data["after"] = after
+        data["order"] = order
+        data["period"] = period
+        data["last"] = topics[-1].id36 if topics else None
+        data["topics"] = topics
+        return data
+
+    def get_topic(self, topic_id):
+        topic = self.store.load_thread(topic_id)
+        if topic is None:
+            raise LookupError(f"Topic {topic_id} is not available offline, run squiggly --sync")
+        return topic
+
+    def iter_topic(self, topic_id, store=None):
+        topic = self.get_topic(topic_id)
+        yield topic._replace(comments=[])
+        yield from topic.comments
+
+    def refresh_topic(self, topic_id):
+        return self.get_topic(topic_id)
+
+    def get_cached(self, method, *args, **kwargs):
+        # Everything is local already
+        return getattr(self, method)(*args, **kwargs)
+
+
+def sync(client, store, pages=4, workers=4, progress=None):
+    """
+    Download the subscribed groups with their recent topics and comments.
+
+    If the client isn't subscribed to anything, e.g. because it isn't logged
+    in, every group is synced instead. A message is passed to progress
+    after each group, if it's given.
+    """
+    groups = client.list_groups()["groups"]
+    store.save_groups(groups)
+
+    subscribed = [group for group in groups if group.subscribed] or groups
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for group in subscribed:
+            topics, after = [], ""
+            for _ in range(pages):
+                data = client.list_topics(group.name, after)
+                topics.extend(data["topics"])
+                after = data["last"]
+                if not after:
+                    break
+            store.save_topics(group.name, topics)
+
+            futures = [executor.submit(client.get_topic, topic.id36) for topic in topics]
+            for topic, future in zip(topics, futures):
+                try:
+                    store.save_thread(future.result())
+                except Exception:
+                    logger.exception(f"Unable to sync topic {topic.id36}")
+            if progress is not None:
+                progress(f"Synced {len(topics)} topics from {group.name}")
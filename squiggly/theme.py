@@ -12,4 +12,12 @@ palette = [
     ("comment_item_focus", "standout", "default"),
     ("load_item", "default", "default"),
     ("load_item_focus", "standout", "default"),
+    ("content_em", "italics", "default"),
+    ("content_strong", "bold", "default"),
+    ("content_code", "dark green", "default"),
+    ("content_quote", "dark gray", "default"),
+    ("content_link", "dark blue,underline", "default"),
+    ("content_strike", "strikethrough", "default"),
+    ("content_heading", "bold,underline", "default"),
+    ("stats", "white", "dark gray"),
 ]
@@ -0,0 +1,21 @@
+from tildee import TildesClient
+
+
+class TransportTildesClient(TildesClient):
+    """
+    TildesClient that sends its GET requests through a squiggly Transport.
+    """
+
+    def __init__(self, transport, *args, **kwargs):
+        self._transport = transport
+        super().__init__(*args, **kwargs)
+
+    def _get(self, route):
+        response = self._transport.get(
+            self.base_url + route,
+            headers=self._headers,
+            cookies=getattr(self, "_cookies", None),
+            verify=getattr(self, "_verify_ssl", True),
+        )
+        response.raise_for_status()
+        return response
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from squiggly.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class NotModified(Exception):
+    """
+    Raised when a conditional request tells us that our copy is still fresh.
+    """
+
+
+class TokenBucket:
+    """
+    An adaptive token bucket rate limiter.
+
+    Tokens refill at the current rate, up to capacity. The rate is halved
+    whenever the server pushes back, and creeps back up towards max_rate
+    with every successful request (additive increase, multiplicative
+    decrease).
+    """
+
+    def __init__(self, rate=2.0, capacity=5, min_rate=0.1, max_rate=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, sleeping until one is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class Transport:
+    """
+    Shared HTTP transport for talking to tildes.
+
+    Requests go through a single keep-alive session with a connection pool,
+    are rate limited by an adaptive token bucket, and are retried with
+    exponential backoff when the connection fails or the server is
+    overloaded. The ETag and Last-Modified validators of every response are
+    remembered so that pages can be revalidated with a conditional request,
+    see conditional().
+
+    requests is imported and the session is created on the first request,
+    so that constructing a Transport doesn't slow down startup.
+    """
+
+    retry_statuses = frozenset([429, 502, 503, 504])
+
+    def __init__(
+        self,
+        session=None,
+        rate=2.0,
+        burst=5,
+        retries=3,
+        backoff=0.5,
+        timeout=30,
+        pool_size=4,
+    ):
+        self.pool_size = pool_size
+        self._session = session
+        self._session_lock = threading.Lock()
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.requests = 0
+        self.retried = 0
+        self.not_modified = 0
+
+        self._validators = {}
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @contextmanager
+    def conditional(self):
+        """
+        Send conditional requests for the duration of the context.
+
+        If the server responds with 304 Not Modified, the NotModified
+        exception is raised from get() so that the caller can stop before
+        parsing anything and use the copy that it already has.
+        """
+        self._local.conditional = True
+        try:
+            yield
+        finally:
+            self._local.conditional = False
+
+    def get(self, url, headers=None, **kwargs):
+        headers = dict(headers or {})
+        conditional = getattr(self._local, "conditional", False)
+        if conditional:
+            etag, last_modified = self._validators.get(url, (None, None))
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        kwargs.setdefault("timeout", self.timeout)
+        response = self._request(url, headers, kwargs)
+
+        if response.status_code == 304 and conditional:
+            self.not_modified += 1
+            raise NotModified(url)
+
+        if response.ok:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self._validators[url] = (etag, last_modified)
+        return response
+
+    def _request(self, url, headers, kwargs):
+        import requests
+
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.incr("http.error")
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2**attempt
+                logger.info(f"GET {url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                metrics.observe("http.get", time.perf_counter() - start)
+                if response.status_code not in self.retry_statuses:
+                    self.bucket.speed_up()
+                    return response
+
+                self.bucket.slow_down()
+                if attempt == self.retries:
+                    return response
+                delay = self.get_retry_after(response) or self.backoff * 2**attempt
+                logger.info(f"GET {url} returned {response.status_code}, retrying in {delay:.1f}s")
+
+            self.retried += 1
+            metrics.incr("http.retry")
+            time.sleep(delay)
+
+    def get_retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def stats(self):
+        """
+        Return request counters, including how many connections were opened.
+
+        Comparing connections against requests shows how well keep-alive
+        connections are being reused.
+        """
+        connections = 0
+        adapters = self._session.adapters.values() if self._session is not None else []
+        for adapter in set(adapters):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                connections += pools[key].num_connections
+
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "not_modified": self.not_modified,
+            "connections": connections,
+            "rate": self.bucket.rate,
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
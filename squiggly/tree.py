@@ -0,0 +1,73 @@
+class CommentTree:
+    """
+    Index a flat, depth-first list of comments by id36 and by subtree.
+
+    In depth-first order every subtree occupies a contiguous span of the
+    flat list, starting with the root comment of the subtree. The end of
+    each span is computed once when the tree is built, which makes it cheap
+    to count descendants, skip over a collapsed subtree, or jump to the next
+    sibling without scanning the comments in between.
+    """
+
+    def __init__(self, comments=()):
+        self.comments = []
+        self.index = {}
+        self.parents = []
+        self.ends = []
+
+        # The comments whose subtrees are still open at the end of the list
+        self._stack = []
+        self.extend(comments)
+
+    def extend(self, comments):
+        """
+        Add comments to the end of the tree, e.g. while a thread is streaming in.
+        """
+        stack = self._stack
+        for comment in comments:
+            position = len(self.comments)
+            while stack and self.comments[stack[-1]].level >= comment.level:
+                self.ends[stack.pop()] = position
+            self.comments.append(comment)
+            self.index[comment.id36] = position
+            self.parents.append(stack[-1] if stack else None)
+            self.ends.append(None)
+            stack.append(position)
+
+        for position in stack:
+            self.ends[position] = len(self.comments)
+
+    def __len__(self):
+        return len(self.comments)
+
+    def position(self, id36):
+        return self.index.get(id36)
+
+    def parent(self, position):
+        return self.parents[position]
+
+    def end(self, position):
+        """
+        The position immediately after the last descendant of the comment.
+        """
+        return self.ends[position]
+
+    def descendants(self, position):
+        return self.ends[position] - position - 1
+
+    def next_sibling(self, position):
+        sibling = self.ends[position]
+        if sibling < len(self.comments) and self.parents[sibling] == self.parents[position]:
+            return sibling
+        return None
+
+    def prev_sibling(self, position):
+        parent = self.parents[position]
+        if position == 0 or position - 1 == parent:
+            return None
+
+        # Climb up from the comment right above until reaching our level
+        sibling = position - 1
+        while self.parents[sibling] != parent:
+            sibling = self.parents[sibling]
+        return sibling
@@ -1,6 +1,12 @@
+import time
+
 import urwid
 
 from squiggly import widgets
+from squiggly.content import render_content
+from squiggly.history import ViewHistory
+from squiggly.metrics import metrics
+from squiggly.tree import CommentTree
 
 
 class Background(widgets.EnhancedWidget, widgets.RepeatedTextFill):
@@ -24,6 +30,13 @@ class Footer(widgets.EnhancedWidget, urwid.Text):
         super().__init__(markdown, wrap="clip")
 
 
+class StatsText(widgets.EnhancedWidget, urwid.Text):
+    attr_name = "stats"
+
+    def __init__(self):
+        super().__init__("", wrap="clip")
+
+
 class ListItem(widgets.EnhancedWidget, widgets.DataWidget):
     signals = ["select"]
 
@@ -38,10 +51,9 @@ class ListItem(widgets.EnhancedWidget, widgets.DataWidget):
 
 
 class GroupItem(ListItem):
-
     def __init__(self, data):
-        widget = urwid.Text(data["desc"])
-        widget = widgets.BoxBorder(widget, title=f"[{data['name']}]", title_align="left")
+        widget = urwid.Text(data.desc)
+        widget = widgets.BoxBorder(widget, title=f"[{data.name}]", title_align="left")
         widget = urwid.AttrMap(widget, "group_item", "group_item_focus")
         widget = urwid.AttrMap(widgets.BoxShadow(widget), "group_item_shadow")
         super().__init__(widget, data)
@@ -52,7 +64,7 @@ class TopicItem(ListItem):
     focus_name = "topic_item_focus"
 
     def __init__(self, data):
-        widget = urwid.Text([data["title"]])
+        widget = urwid.Text([data.title])
         super().__init__(widget, data)
 
 
@@ -60,8 +72,24 @@ class CommentItem(ListItem):
     attr_name = "comment_item"
     focus_name = "comment_item_focus"
 
+    def __init__(self, data, hidden=0):
+        markup = [render_content(data.content)]
+        if hidden:
+            markup.append(f"\n[+{hidden} hidden]")
+        widget = widgets.CachedLayoutText(markup, (data.id36, data.content, hidden))
+        super().__init__(widget, data)
+
+
+class SearchResultItem(ListItem):
+    attr_name = "topic_item"
+    focus_name = "topic_item_focus"
+
     def __init__(self, data):
-        widget = urwid.Text([data["content"] or ""])
+        if data.comment_id is not None:
+            heading = f"{data.title} - comment by {data.author}"
+        else:
+            heading = f"{data.title} - ~{data.group}"
+        widget = urwid.Text([("content_strong", heading), "\n", data.snippet, "\n"])
         super().__init__(widget, data)
 
 
@@ -77,6 +105,20 @@ class LoadItem(ListItem):
 class ListBox(widgets.EnhancedWidget, widgets.DataWidget):
     signals = ["close"]
 
+    # The LazyListWalker behind the list, set by subclasses
+    walker = None
+
+    @property
+    def built_widgets(self):
+        return self.walker.built if self.walker is not None else 0
+
+    def release(self):
+        """
+        Throw away the built widgets to save memory, keeping the data and focus.
+        """
+        if self.walker is not None:
+            self.walker.invalidate()
+
     def keypress(self, size, key):
         if key == "left":
             self.emit_signal("close")
@@ -85,32 +127,50 @@ class ListBox(widgets.EnhancedWidget, widgets.DataWidget):
 
 
 class TopicListBox(ListBox):
-    signals = ["select", "more"]
+    signals = ["select", "more", "focus"]
 
     def __init__(self, data):
+        # When the listing was fetched, to tell whether it's worth reusing
+        self.loaded_at = time.monotonic()
+
         topics = data.setdefault("topics", [])
-        list_items = self.build_list_items(topics)
-        widget = urwid.ListBox(urwid.SimpleFocusListWalker(list_items))
+        walker = widgets.LazyListWalker(topics, self.build_list_item, self.build_load_item(topics))
+        urwid.connect_signal(walker, "modified", self.emit_signal, user_args=["focus"])
+        self.walker = walker
+        widget = urwid.ListBox(walker)
         super().__init__(widget, data)
 
-    def build_list_items(self, topics):
-        items = []
-        for data in topics:
-            topic_item = TopicItem(data)
-            topic_item.forward_signal("select", self, "select")
-            items.append(topic_item)
+    @property
+    def focus_topic(self):
+        """
+        The data for the topic in focus, or None if there's no topic selected.
+        """
+        focus_item = self._w.focus
+        return focus_item.data if focus_item is not None else None
+
+    @property
+    def items_below_focus(self):
+        if self._w.focus is None:
+            return 0
+        return len(self._w.body) - 1 - self._w.focus_position
+
+    def build_list_item(self, data):
+        topic_item = TopicItem(data)
+        topic_item.forward_signal("select", self, "select")
+        return topic_item
 
-        if topics:
-            load_item = LoadItem()
-            load_item.forward_signal("select", self, "more", replace_args=True)
-            items.append(load_item)
+    def build_load_item(self, topics):
+        if not topics:
+            return None
 
-        return items
+        load_item = LoadItem()
+        load_item.forward_signal("select", self, "more", replace_args=True)
+        return load_item
 
     def load_more(self, data):
         topics = data.setdefault("topics", [])
-        self._w.body[-1:] = self.build_list_items(topics)
-        self.data["last"] = topics[-1]["id36"] if topics else None
+        self._w.body.extend(topics, self.build_load_item(topics))
+        self.data["last"] = topics[-1].id36 if topics else None
 
 
 class GroupListBox(ListBox):
@@ -119,48 +179,211 @@ class GroupListBox(ListBox):
 
     def __init__(self, data):
         groups = data.setdefault("groups", [])
-        list_items = self.build_list_items(groups)
-        widget = urwid.ListBox(urwid.SimpleFocusListWalker(list_items))
+        self.walker = widgets.LazyListWalker(groups, self.build_list_item)
+        widget = urwid.ListBox(self.walker)
         widget = widgets.BoxPadding(widget, top=0, bottom=0)
         super().__init__(widget, data)
 
-    def build_list_items(self, groups):
-        items = []
-        for data in groups:
-            group_item = GroupItem(data)
-            group_item.forward_signal("select", self, "select")
-            items.append(group_item)
-        return items
+    def build_list_item(self, data):
+        group_item = GroupItem(data)
+        group_item.forward_signal("select", self, "select")
+        return group_item
 
 
 class CommentListBox(ListBox):
-    signals = ["select"]
+    """
+    Keys:
+        space - collapse or expand the replies to the comment
+        p     - jump to the parent comment
+        n/N   - jump to the next/previous sibling comment
+        r     - check for new comments
+    """
+
+    signals = ["select", "refresh"]
+
+    def __init__(self, data=None):
+        comments = data.comments if data is not None else []
+        self.tree = CommentTree(comments)
+        walker = widgets.CollapsibleListWalker(comments, self.build_list_item, self.tree)
+        self.walker = walker
+        widget = urwid.ListBox(walker)
+        super().__init__(widget, data)
 
-    def __init__(self, data):
-        comments = data.setdefault("comments", [])
-        list_items = self.build_list_items(comments)
-        widget = urwid.ListBox(urwid.SimpleFocusListWalker(list_items))
+        # False while the comments are still streaming in
+        self.complete = True
+
+    def build_list_item(self, data):
+        position = self.tree.position(data.id36)
+        hidden = 0
+        if position in self._w.body.collapsed:
+            hidden = self.tree.descendants(position)
+
+        comment_item = CommentItem(data, hidden)
+        comment_item.forward_signal("select", self, "select")
+        return comment_item
+
+    def keypress(self, size, key):
+        if key == "r" and self.data is not None:
+            self.emit_signal("refresh")
+            return
+
+        position = self._w.focus_position if self._w.focus is not None else None
+        if position is None:
+            return super().keypress(size, key)
+
+        if key == " ":
+            if self.tree.descendants(position):
+                self._w.body.toggle_collapsed(position)
+        elif key == "p":
+            self.set_focus(self.tree.parent(position))
+        elif key == "n":
+            self.set_focus(self.tree.next_sibling(position))
+        elif key == "N":
+            self.set_focus(self.tree.prev_sibling(position))
+        else:
+            return super().keypress(size, key)
+
+    def focus_comment(self, id36):
+        self.set_focus(self.tree.position(id36))
+
+    def set_focus(self, position):
+        if position is not None:
+            self._w.set_focus(position)
+            self._w.set_focus_valign("top")
+
+    def append(self, comments):
+        """
+        Add comments to the end of the thread while it's streaming in.
+        """
+        walker = self._w.body
+        self.tree.extend(comments)
+        # Collapsed comments display their number of replies, which may have
+        # grown if the end of their subtree was still streaming in
+        walker.invalidate(walker.collapsed)
+        walker.extend(comments)
+
+    def refresh(self, data):
+        """
+        Merge a newer copy of the topic into the list.
+
+        Comments are matched up by id36. Widgets for comments that haven't
+        changed are kept, new and edited comments are built when they're
+        scrolled into view. Collapsed subtrees and the focused comment are
+        preserved. Returns the number of new or changed comments.
+        """
+        walker = self._w.body
+        old_comments, old_tree = self.data.comments, self.tree
+        focus_id = old_comments[walker.focus].id36 if old_comments else None
+
+        tree = CommentTree(data.comments)
+        keep = {}
+        changed = 0
+        for position, comment in enumerate(data.comments):
+            old_position = old_tree.position(comment.id36)
+            if old_position is None or old_comments[old_position] != comment:
+                changed += 1
+            elif old_position not in walker.collapsed:
+                # Collapsed comments display their number of replies, which
+                # may have changed, so those widgets are always rebuilt.
+                keep[position] = old_position
+
+        collapsed = {old_comments[position].id36 for position in walker.collapsed}
+        walker.collapsed = {tree.position(id36) for id36 in collapsed} - {None}
+        walker.tree = self.tree = tree
+        self.data = data
+
+        focus = tree.position(focus_id)
+        walker.set_items(data.comments, keep, focus if focus is not None else walker.focus)
+        return changed
+
+
+class SearchListBox(ListBox):
+    """
+    Keys:
+        up/down - move between the search box and the results
+        esc     - close the search
+    """
+
+    signals = ["select", "search"]
+
+    def __init__(self, data=None):
+        data = data if data is not None else {"query": ""}
+        results = data.setdefault("results", [])
+        self.edit = urwid.Edit("Search: ", data["query"])
+        urwid.connect_signal(self.edit, "postchange", self.on_change)
+        self.walker = widgets.LazyListWalker(results, self.build_list_item)
+        widget = urwid.Frame(urwid.ListBox(self.walker), header=self.edit, focus_part="header")
         super().__init__(widget, data)
 
-    def build_list_items(self, comments):
-        items = []
-        for data in comments:
-            comment_item = CommentItem(data)
-            comment_item.forward_signal("select", self, "select")
-            items.append(comment_item)
-        return items
+    def build_list_item(self, data):
+        result_item = SearchResultItem(data)
+        result_item.forward_signal("select", self, "select")
+        return result_item
 
+    def on_change(self, *_):
+        self.data["query"] = self.edit.edit_text
+        self.emit_signal("search")
 
-class SquigglyView(widgets.EnhancedWidget, urwid.WidgetWrap):
-    signals = ["group_select", "topic_select", "topic_more", "topic_close", "comment_close"]
+    def focus_query(self):
+        self._w.focus_position = "header"
 
-    def __init__(self):
+    def set_results(self, query, results):
+        """
+        Display the results of a search, unless the query has changed since.
+        """
+        if query != self.data["query"]:
+            return
+
+        self.data["results"] = results
+        self.edit.set_caption(f"Search ({len(results)}): " if query else "Search: ")
+        self.walker.set_items(results, focus=0)
+
+    def keypress(self, size, key):
+        if key == "esc":
+            self.emit_signal("close")
+            return
+
+        # Skip ListBox.keypress, left has to move the cursor in the search box
+        key = self._w.keypress(size, key)
+        if key == "down" and self._w.focus_position == "header" and self.data["results"]:
+            self._w.focus_position = "body"
+        elif key == "up" and self._w.focus_position == "body":
+            self._w.focus_position = "header"
+        elif key == "left":
+            self.emit_signal("close")
+        else:
+            return key
+
+
+class SquigglyView(widgets.EnhancedWidget, urwid.WidgetWrap):
+    signals = [
+        "group_select",
+        "topic_select",
+        "topic_more",
+        "topic_focus",
+        "topic_close",
+        "comment_close",
+        "comment_refresh",
+        "cancel",
+        "stats_toggle",
+        "search",
+        "search_select",
+        "front_page",
+    ]
+
+    default_status = "Stay frosty"
+
+    def __init__(self, history_size=32, history_budget=2000):
+        self.status = Footer(self.default_status)
         self.header = urwid.AttrMap(widgets.BoxShadow(Header(" ~ Squiggly ~")), "group_item_shadow")
-        self.footer = urwid.AttrMap(widgets.BoxShadow(Footer("Stay frosty")), "group_item_shadow")
+        self.footer = urwid.AttrMap(widgets.BoxShadow(self.status), "group_item_shadow")
         self.topic_view = TopicListBox({})
         self.group_view = GroupListBox({})
-        self.comment_view = CommentListBox({})
+        self.comment_view = CommentListBox()
+        self.search_view = SearchListBox()
         self.frame = urwid.Frame(self.group_view, self.header, self.footer)
+        self.history = ViewHistory(history_size, history_budget)
+        self.history.push(self.group_view)
         self.foreground = widgets.BoxShadow(self.frame)
         self.background = Background()
         self.overlay = urwid.Overlay(
@@ -171,6 +394,16 @@ class SquigglyView(widgets.EnhancedWidget, urwid.WidgetWrap):
             valign="middle",
             height=100,
         )
+        self.stats = StatsText()
+        self.stats_overlay = urwid.Overlay(
+            top_w=urwid.AttrMap(urwid.LineBox(self.stats, "Stats"), "stats"),
+            bottom_w=self.overlay,
+            align="right",
+            width=("relative", 60),
+            valign="top",
+            height="pack",
+            min_width=40,
+        )
         super().__init__(self.overlay)
 
     @property
@@ -181,6 +414,7 @@ class SquigglyView(widgets.EnhancedWidget, urwid.WidgetWrap):
     def topic_view(self, topic_listbox):
         topic_listbox.forward_signal("select", self, "topic_select")
         topic_listbox.forward_signal("more", self, "topic_more")
+        topic_listbox.forward_signal("focus", self, "topic_focus")
         topic_listbox.connect_signal("close", self.on_topic_close)
         self._topic_view = topic_listbox
 
@@ -200,19 +434,147 @@ class SquigglyView(widgets.EnhancedWidget, urwid.WidgetWrap):
     @comment_view.setter
     def comment_view(self, comment_listbox):
         comment_listbox.connect_signal("close", self.on_comment_close)
+        comment_listbox.forward_signal("refresh", self, "comment_refresh")
         self._comment_view = comment_listbox
 
+    @property
+    def search_view(self):
+        return self._search_view
+
+    @search_view.setter
+    def search_view(self, search_listbox):
+        search_listbox.forward_signal("select", self, "search_select")
+        search_listbox.forward_signal("search", self, "search")
+        search_listbox.connect_signal("close", self.on_search_close)
+        self._search_view = search_listbox
+
+    def keypress(self, size, key):
+        # Bypass the stats overlay, it's display only and would swallow the keys
+        key = self.overlay.keypress(size, key)
+        if key == "esc":
+            self.emit_signal("cancel")
+        elif key == "f2":
+            self.toggle_stats()
+        elif key == "/":
+            self.open_search()
+        elif key == "f":
+            self.emit_signal("front_page")
+        elif key in ("[", "backspace"):
+            self.back()
+        elif key == "]":
+            self.forward()
+        else:
+            return key
+
+    @property
+    def stats_visible(self):
+        return self._w is self.stats_overlay
+
+    def toggle_stats(self):
+        """
+        Show or hide the metrics overlay in the top right corner.
+        """
+        if self.stats_visible:
+            self._w = self.overlay
+        else:
+            self.update_stats()
+            self._w = self.stats_overlay
+        self.emit_signal("stats_toggle")
+
+    def update_stats(self):
+        self.stats.set_text(metrics.format())
+
+    def set_status(self, message=None):
+        """
+        Display a message in the footer, or restore the default message.
+        """
+        self.status.set_text(message or self.default_status)
+
+    def set_loading(self, message="Loading..."):
+        self.set_status(f"{message} (esc to cancel)")
+
+    def show(self, view):
+        """
+        Display a view and add it to the history.
+        """
+        self.history.push(view)
+        self._display(view)
+
+    def back(self):
+        view = self.history.back()
+        if view is not None:
+            self._display(view)
+        return view
+
+    def forward(self):
+        view = self.history.forward()
+        if view is not None:
+            self._display(view)
+        return view
+
+    def _display(self, view):
+        if isinstance(view, TopicListBox):
+            self._topic_view = view
+        elif isinstance(view, CommentListBox):
+            self._comment_view = view
+        self.frame.body = view
+
+    def find_topic_view(self, group):
+        """
+        Return the listing for the group from history, or None.
+        """
+        return self.history.find(
+            lambda view: isinstance(view, TopicListBox) and view.data.get("group") == group
+        )
+
+    def find_comment_view(self, topic_id):
+        """
+        Return the thread for the topic from history, or None.
+        """
+
+        def match(view):
+            if isinstance(view, CommentListBox) and view.data is not None:
+                return view.data.id36 == topic_id
+            return False
+
+        return self.history.find(match)
+
     def load_topic_view(self, data):
-        self.frame.body = self.topic_view = TopicListBox(data)
+        old_view = self.find_topic_view(data.get("group"))
+        self.topic_view = TopicListBox(data)
+        if old_view is not None:
+            # Replace an outdated copy of the listing instead of keeping both
+            self.history.replace(old_view, self.topic_view)
+        self.show(self.topic_view)
 
     def load_group_view(self, data):
-        self.frame.body = self.group_view = GroupListBox(data)
+        # The group list can be refreshed in the background after startup,
+        # don't pull the user out of a topic if that happens
+        old_view = self.group_view
+        self.group_view = GroupListBox(data)
+        self.history.replace(old_view, self.group_view)
+        if self.frame.body is old_view:
+            self.frame.body = self.group_view
 
     def load_comment_view(self, data):
-        self.frame.body = self.comment_view = CommentListBox(data)
+        old_view = self.find_comment_view(data.id36)
+        self.comment_view = CommentListBox(data)
+        if old_view is not None:
+            # Replace an outdated copy of the thread instead of keeping both
+            self.history.replace(old_view, self.comment_view)
+        self.show(self.comment_view)
+
+    def open_search(self):
+        self.show(self.search_view)
+        self.search_view.focus_query()
+
+    def on_search_close(self, *_):
+        self.back()
 
     def on_topic_close(self, *_):
-        self.frame.body = self.group_view
+        self.back()
+        self.emit_signal("topic_close")
 
     def on_comment_close(self, *_):
-        self.frame.body = self.topic_view
+        self.back()
+        self.emit_signal("comment_close")
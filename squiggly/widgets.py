@@ -9,9 +9,14 @@
 |-------------|------------------------|------------------------|
 """
 import logging
+import time
+from collections import OrderedDict
 
 import urwid
 
+from squiggly.cache import LRUCache
+from squiggly.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,6 +28,11 @@ class EnhancedWidget(urwid.Widget):
     attr_name = None
     focus_name = None
 
+    # Set to True to record the time spent in render() for each widget class
+    # in the "render.<class name>" metrics, see render_stats(). The times
+    # include any nested widgets.
+    profile_render = False
+
     def render(self, size, focus=False):
         """
         Apply the class attr_name and focus_name on top of the widget canvas.
@@ -30,22 +40,47 @@ class EnhancedWidget(urwid.Widget):
         This is an alternative way of doing AttrMap(widget, ...) without
         needing to wrap every instance of the class with an AttrMap.
         """
-        mode = ["FIXED", "FLOW", "BOX"][len(size)]
-        logger.debug(f"Rendering {self} as {mode} (focus={focus})")
+        if logger.isEnabledFor(logging.DEBUG):
+            mode = ["FIXED", "FLOW", "BOX"][len(size)]
+            logger.debug("Rendering %s as %s (focus=%s)", self, mode, focus)
 
-        if focus and self.focus_name is not None:
-            attr_map = {None: self.focus_name}
-        elif self.attr_name:
-            attr_map = {None: self.attr_name}
-        else:
-            attr_map = None
+        if self.profile_render:
+            start = time.perf_counter()
 
         canvas = super().render(size, focus=focus)
+        attr_map = self.get_attr_map(focus)
         if attr_map is not None:
             canvas = urwid.CompositeCanvas(canvas)
             canvas.fill_attr_apply(attr_map)
+
+        if self.profile_render:
+            metrics.observe(f"render.{type(self).__name__}", time.perf_counter() - start)
+
         return canvas
 
+    def get_attr_map(self, focus):
+        if focus and self.focus_name is not None:
+            return {None: self.focus_name}
+        elif self.attr_name:
+            return {None: self.attr_name}
+        else:
+            return None
+
+    @classmethod
+    def render_stats(cls):
+        """
+        Return the number of renders and the total time spent per widget class.
+        """
+        stats = {}
+        for name, histogram in list(metrics.histograms.items()):
+            if name.startswith("render."):
+                stats[name[7:]] = {
+                    "calls": histogram.count,
+                    "total": histogram.total,
+                    "mean": histogram.mean,
+                }
+        return stats
+
     def connect_signal(self, name, handler):
         """
         Shorthand to connect a signal to a handler function
@@ -77,8 +112,13 @@ class RepeatedTextFill(urwid.Widget):
     A widget that fills the screen with a single line of text.
 
     This is intended to be used like a SolidFill but with more than one
-    character. Unicode characters with != 1 width are not supported, because
-    urwid's text layout library make my head spin.
+    character. Each row is shifted by line_offset columns from the row
+    above it, so the rows repeat with a period of at most the width of the
+    fill text. The encoded rows are computed once per screen width and the
+    canvas is reused until the widget is resized.
+
+    Wide characters are supported. When a wide character would be cut in
+    half at the edge of the screen, that column is filled with a space.
     """
 
     _sizing = frozenset([urwid.BOX])
@@ -89,36 +129,130 @@ class RepeatedTextFill(urwid.Widget):
         self.__super.__init__()
         self.fill_text = fill_text
         self.line_offset = line_offset
+        self._cells = self.split_cells(fill_text)
+        self._rows = {}
+        self._canvas = None
+
+    @staticmethod
+    def split_cells(text):
+        """
+        Split text into a list with one entry per screen column.
+
+        Wide characters occupy their first column and leave empty strings in
+        the columns after it. Zero-width characters are combined with the
+        character before them.
+        """
+        cells = []
+        last = None
+        for char in text:
+            width = urwid.str_util.get_width(ord(char))
+            if width == 0:
+                if last is not None:
+                    cells[last] += char
+                continue
+            last = len(cells)
+            cells.append(char)
+            cells.extend([""] * (width - 1))
+        return cells
+
+    def render_row(self, max_col, offset):
+        """
+        Return the encoded row that starts at the given column of the fill text.
+        """
+        key = (max_col, offset)
+        row = self._rows.get(key)
+        if row is None:
+            repeat = (offset + max_col) // len(self._cells) + 1
+            cells = (self._cells * repeat)[offset : offset + max_col]
+            if cells and cells[0] == "":
+                cells[0] = " "
+            if cells and urwid.calc_width(cells[-1], 0, len(cells[-1])) > 1:
+                cells[-1] = " "
+            row = self._rows[key] = "".join(cells).encode()
+        return row
 
     def render(self, size, focus=False):
         max_col, max_row = size
+        if self._canvas is not None and self._canvas.cols() == max_col:
+            if self._canvas.rows() == max_row:
+                return self._canvas
 
-        text_buffer = self.fill_text * (max_col // len(self.fill_text) + 2)
+        if any(key[0] != max_col for key in self._rows):
+            self._rows = {}
 
-        text = []
-        for i in range(max_row):
-            offset = (self.line_offset * i) % len(self.fill_text)
-            text.append(text_buffer[offset : offset + max_col])
+        period = len(self._cells)
+        text = [self.render_row(max_col, (self.line_offset * i) % period) for i in range(max_row)]
+        self._canvas = urwid.TextCanvas(text, maxcol=max_col, check_width=False)
+        return self._canvas
 
-        raw_text = [line.encode() for line in text]
-        return urwid.TextCanvas(raw_text, maxcol=max_col, check_width=False)
 
-
-class BoxShadow(urwid.WidgetDecoration, urwid.WidgetWrap):
+class BoxShadow(urwid.WidgetDecoration):
     """
     Draw a half-width unicode box shadow behind the widget.
 
     Derived from urwid.LineBox, organic 100% cage-free.
+
+    The shadow edges are overlaid straight onto the widget's canvas instead
+    of laying out a Pile and Columns of Text, SolidFill and Divider widgets
+    around it. The edge canvases only depend on their size, so they're
+    rendered once and shared between every shadow on the screen.
     """
-    def __init__(self, original_widget):
-        right_shadow = urwid.Pile([("pack", urwid.Text("▖")), urwid.SolidFill("▌")])
-        box = urwid.Columns([original_widget, ("fixed", 1, right_shadow)], box_columns=[1])
-        bottom_shadow = urwid.Columns(
-            [("fixed", 1, urwid.Text("▝")), urwid.Divider("▀"), ("fixed", 1, urwid.Text("▘"))]
-        )
-        widget = urwid.Pile([box, ("pack", bottom_shadow)])
-        urwid.WidgetDecoration.__init__(self, original_widget)
-        urwid.WidgetWrap.__init__(self, widget)
+
+    _sizing = frozenset([urwid.FLOW, urwid.BOX])
+
+    right_edges = LRUCache(256)
+    bottom_edges = LRUCache(256)
+
+    def sizing(self):
+        return self._sizing
+
+    @classmethod
+    def right_edge(cls, rows):
+        canvas = cls.right_edges.get(rows)
+        if canvas is None:
+            text = urwid.Text("\n".join(["▖"] + ["▌"] * (rows - 1)))
+            canvas = cls.right_edges[rows] = urwid.CompositeCanvas(text.render((1,)))
+        return canvas
+
+    @classmethod
+    def bottom_edge(cls, cols):
+        canvas = cls.bottom_edges.get(cols)
+        if canvas is None:
+            text = urwid.Text("▝" + "▀" * (cols - 2) + "▘", wrap="clip")
+            canvas = cls.bottom_edges[cols] = urwid.CompositeCanvas(text.render((cols,)))
+        return canvas
+
+    def child_size(self, size):
+        if len(size) == 2:
+            return (size[0] - 1, size[1] - 1)
+        return (size[0] - 1,)
+
+    def rows(self, size, focus=False):
+        return self.original_widget.rows(self.child_size(size), focus) + 1
+
+    def render(self, size, focus=False):
+        canvas = self.original_widget.render(self.child_size(size), focus)
+        cols, rows = canvas.cols(), canvas.rows()
+        if not rows:
+            return self.bottom_edge(cols + 1)
+
+        canvas = urwid.CompositeCanvas(canvas)
+        canvas.pad_trim_left_right(0, 1)
+        canvas.pad_trim_top_bottom(0, 1)
+        canvas.overlay(self.right_edge(rows), cols, 0)
+        canvas.overlay(self.bottom_edge(cols + 1), 0, rows)
+        return canvas
+
+    def keypress(self, size, key):
+        return self.original_widget.keypress(self.child_size(size), key)
+
+    def mouse_event(self, size, event, button, col, row, focus):
+        child_size = self.child_size(size)
+        if col >= child_size[0] or (len(size) == 2 and row >= child_size[1]):
+            return False
+        if not hasattr(self.original_widget, "mouse_event"):
+            return False
+        return self.original_widget.mouse_event(child_size, event, button, col, row, focus)
 
 
 class BoxPadding(urwid.WidgetDecoration, urwid.WidgetWrap):
@@ -176,6 +310,36 @@ class SingleFocusPile(urwid.Pile):
         return out
 
 
+class CachedLayoutText(urwid.Text):
+    """
+    A Text widget that shares its wrapped layout between instances.
+
+    urwid.Text only remembers the layout for the last width that it was
+    rendered at, and the layout is lost whenever the widget is rebuilt. This
+    class stores the layout in a shared cache keyed on (layout_key, width),
+    so that scrolling back to a comment or resizing the terminal back and
+    forth doesn't need to wrap the same text again. The layout_key must
+    uniquely identify the text, and the text should not be changed after
+    the widget has been created.
+    """
+
+    layout_cache = LRUCache(8192)
+
+    def __init__(self, markup, layout_key, **kwargs):
+        self.layout_key = layout_key
+        super().__init__(markup, **kwargs)
+
+    def _update_cache_translation(self, maxcol, ta):
+        key = (self.layout_key, maxcol, self._align_mode, self._wrap_mode)
+        translation = self.layout_cache.get(key)
+        if translation is None:
+            super()._update_cache_translation(maxcol, ta)
+            self.layout_cache[key] = self._cache_translation
+        else:
+            self._cache_maxcol = maxcol
+            self._cache_translation = translation
+
+
 class DataWidget(urwid.WidgetWrap):
     """
     Widget wrapper that additionally stores data representing the widget.
@@ -184,3 +348,188 @@ class DataWidget(urwid.WidgetWrap):
     def __init__(self, widget, data=None):
         self.data = data
         super().__init__(widget)
+
+
+class LazyListWalker(urwid.ListWalker):
+    """
+    A list walker that builds its widgets on demand from a list of data.
+
+    SimpleFocusListWalker needs every widget to be constructed before the
+    first frame is drawn, which gets slow for threads with thousands of
+    comments. This walker calls build_widget(item) the first time that a
+    position is requested by the ListBox, and only holds on to the most
+    recently used widgets. Anything else can be rebuilt from the data.
+
+    An optional tail widget can be placed after the last item, e.g. to add
+    a button to load more items.
+    """
+
+    def __init__(self, items, build_widget, tail=None, max_widgets=256):
+        self.items = items
+        self.build_widget = build_widget
+        self.tail = tail
+        self.max_widgets = max_widgets
+        self.focus = 0
+        self._widgets = OrderedDict()
+
+    def __len__(self):
+        return len(self.items) + (self.tail is not None)
+
+    @property
+    def built(self):
+        """
+        The number of widgets that are currently built.
+        """
+        return len(self._widgets)
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        if position == len(self.items):
+            return self.tail
+
+        widget = self._widgets.get(position)
+        if widget is not None:
+            self._widgets.move_to_end(position)
+            return widget
+
+        start = time.perf_counter()
+        widget = self._widgets[position] = self.build_widget(self.items[position])
+        metrics.observe(f"build.{type(widget).__name__}", time.perf_counter() - start)
+        while len(self._widgets) > self.max_widgets:
+            oldest = next(iter(self._widgets))
+            if oldest == self.focus:
+                self._widgets.move_to_end(oldest)
+            else:
+                del self._widgets[oldest]
+        return widget
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def next_position(self, position):
+        if position >= len(self) - 1:
+            raise IndexError
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError
+        return position - 1
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(len(self) - 1, -1, -1)
+        return range(len(self))
+
+    def extend(self, items, tail=None):
+        """
+        Append items to the end of the list, replacing the tail widget.
+
+        If the tail widget was in focus, the focus will move to the first of
+        the new items.
+        """
+        self.items.extend(items)
+        self.tail = tail
+        self.focus = min(self.focus, max(len(self) - 1, 0))
+        self._modified()
+
+    def set_items(self, items, keep=None, focus=None):
+        """
+        Replace the list of items.
+
+        The keep argument maps positions in the new list to positions in the
+        old list whose items haven't changed, so that their widgets can be
+        reused instead of being rebuilt.
+        """
+        widgets = OrderedDict()
+        for position, old_position in (keep or {}).items():
+            widget = self._widgets.get(old_position)
+            if widget is not None:
+                widgets[position] = widget
+
+        self.items = items
+        self._widgets = widgets
+        if focus is not None:
+            self.focus = focus
+        self.focus = min(self.focus, max(len(self) - 1, 0))
+        self._modified()
+
+    def invalidate(self, positions=None):
+        """
+        Throw away the built widgets, e.g. after the items have changed.
+
+        If positions is given, only the widgets at those positions are
+        thrown away.
+        """
+        if positions is None:
+            self._widgets.clear()
+        else:
+            for position in positions:
+                self._widgets.pop(position, None)
+        self.focus = min(self.focus, max(len(self) - 1, 0))
+        self._modified()
+
+
+class CollapsibleListWalker(LazyListWalker):
+    """
+    A LazyListWalker over a tree of items stored in depth-first order, where
+    any subtree can be collapsed so that only its root item is displayed.
+
+    The tree must provide parent(position), and end(position) which returns
+    the position immediately after the last descendant of an item.
+    """
+
+    def __init__(self, items, build_widget, tree, **kwargs):
+        super().__init__(items, build_widget, **kwargs)
+        self.tree = tree
+        self.collapsed = set()
+
+    def next_position(self, position):
+        if position in self.collapsed:
+            position = self.tree.end(position)
+        else:
+            position += 1
+
+        if position >= len(self):
+            raise IndexError
+        return position
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError
+
+        # The item above may be hidden inside of a collapsed subtree, in which
+        # case we need to land on the outermost collapsed ancestor instead.
+        position -= 1
+        if self.collapsed:
+            ancestor = self.tree.parent(position)
+            while ancestor is not None:
+                if ancestor in self.collapsed:
+                    position = ancestor
+                ancestor = self.tree.parent(ancestor)
+        return position
+
+    def positions(self, reverse=False):
+        if not self.collapsed:
+            return super().positions(reverse)
+        return self._iter_positions(reverse)
+
+    def _iter_positions(self, reverse):
+        step = self.prev_position if reverse else self.next_position
+        try:
+            position = self.prev_position(len(self)) if reverse else 0
+            while True:
+                yield position
+                position = step(position)
+        except IndexError:
+            return
+
+    def toggle_collapsed(self, position):
+        if position in self.collapsed:
+            self.collapsed.remove(position)
+        else:
+            self.collapsed.add(position)
+        self._widgets.pop(position, None)
+        self._modified()
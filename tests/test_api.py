@@ -0,0 +1,14 @@
+from benchmarks.fixtures import FakeTildesClient
+from squiggly.api import Client
+from squiggly.cache import ResponseCache
+
+
+def test_cache_key_includes_page_size():
+    cache = ResponseCache()
+    fake = FakeTildesClient(num_topics=12)
+    assert len(Client(cache, per_page=5, tildes_client=fake).list_topics("~test")["topics"]) == 5
+    assert len(Client(cache, per_page=2, tildes_client=fake).list_topics("~test")["topics"]) == 2
+
+    # Topics don't depend on the page size, so their entries are shared
+    key = Client.get_topic.cache_key
+    assert key(Client(per_page=5), "t1") == key(Client(per_page=2), "t1")
@@ -0,0 +1,7 @@
+from benchmarks import bench_api, bench_pool, bench_search, bench_views, runner  # noqa: F401
+
+
+def test_benchmarks_run():
+    results = list(runner.run(repeat=1, quick=True))
+    assert {result["name"] for result in results} == {name for name, *_ in runner.registry}
+    assert all(result["min"] > 0 for result in results)
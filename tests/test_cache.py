@@ -0,0 +1,47 @@
+from squiggly.cache import ResponseCache
+
+
+def test_expire_writes_through(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path=path)
+    cache.set("topic", {"comments": 1}, ttl=60)
+    cache.expire("topic")
+    assert cache.get("topic") is None
+    assert cache.get("topic", stale=True) == {"comments": 1}
+    cache.close()
+
+    # A new session must not treat the disk copy as fresh either
+    cache = ResponseCache(path=path)
+    assert cache.get("topic") is None
+    assert cache.get("topic", stale=True) == {"comments": 1}
+    cache.close()
+
+
+def test_disk_limits(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"), disk_entries=3, disk_bytes=10**6)
+    for i in range(5):
+        cache.set(i, "x" * 100, ttl=60 + i)
+    cache.close()
+
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    assert [cache.get(i) for i in range(5)] == [None, None] + ["x" * 100] * 3
+    cache.close()
+
+
+def test_disk_limits_count_replaced_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path=path, disk_entries=3, disk_bytes=10**6)
+    cache.set("a", "x", ttl=60)
+    for _ in range(5):
+        cache.set("b", "x" * 100, ttl=120)
+    cache.close()
+
+    # The totals are counted again when the database is reopened
+    cache = ResponseCache(path=path, disk_entries=3, disk_bytes=200)
+    assert cache.get("a") == "x"
+    cache.set("c", "x" * 100, ttl=180)
+    cache.close()
+
+    cache = ResponseCache(path=path)
+    assert [cache.get(key) for key in "abc"] == [None, None, "x" * 100]
+    cache.close()
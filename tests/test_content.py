@@ -0,0 +1,63 @@
+from squiggly.content import render_content
+
+
+def plain_text(markup):
+    if isinstance(markup, str):
+        return markup
+    return "".join(item if isinstance(item, str) else item[1] for item in markup)
+
+
+def test_plain_text_is_unchanged():
+    # Without any HTML, the content is displayed as is, the same as before
+    assert render_content("") == ""
+    assert render_content("fish & chips") == "fish & chips"
+    assert plain_text(render_content("1 < 2 and x<y")) == "1 < 2 and x<y"
+
+
+def test_nested_markup():
+    markup = render_content("<p>Some <em>nested <strong>bold</strong> text</em> here</p>")
+    assert markup == [
+        "Some ",
+        ("content_em", "nested "),
+        ("content_strong", "bold"),
+        ("content_em", " text"),
+        " here",
+    ]
+
+
+def test_paragraphs_and_lists():
+    markup = render_content("<p>One</p><p>Two  \n lines</p>")
+    assert plain_text(markup) == "One\n\nTwo lines"
+
+    markup = render_content("<ul><li>one</li><li>two<ol><li>a</li><li>b</li></ol></li></ul>")
+    assert plain_text(markup) == "• one\n• two\n  1. a\n  2. b"
+
+    markup = render_content("<blockquote><p>quoted</p></blockquote><p>reply</p>")
+    assert markup[:2] == [("content_quote", "│ "), ("content_quote", "quoted")]
+    assert plain_text(markup) == "│ quoted\n\nreply"
+
+
+def test_code_block():
+    markup = render_content("<pre><code>def f():\n    return 1\n</code></pre>")
+    assert plain_text(markup) == "def f():\n    return 1"
+    assert {attr for attr, _ in markup} == {"content_code"}
+
+
+def test_links():
+    markup = render_content(
+        '<p><a href="https://example.com">this</a> '
+        '<a href="https://example.com">https://example.com</a> '
+        '<a href="/~test">~test</a></p>'
+    )
+    # The target is only spelled out if it's external and differs from the text
+    assert plain_text(markup) == "this <https://example.com> https://example.com ~test"
+    assert markup[0] == ("content_link", "this")
+
+
+def test_malformed_html():
+    markup = render_content("<p>unclosed <em>emphasis <strong>and</em> bad</strong> nesting")
+    assert plain_text(markup) == "unclosed emphasis and bad nesting"
+    assert markup[-1] == " nesting"
+
+    markup = render_content("<p>entities &amp; &lt;3 <b>unclosed")
+    assert plain_text(markup) == "entities & <3 unclosed"
@@ -0,0 +1,66 @@
+import io
+import json
+from argparse import Namespace
+
+from benchmarks.fixtures import FakeTildesClient
+from squiggly import export as export_command
+from squiggly.api import Client
+from squiggly.export import Checkpoint, export
+
+
+def run_export(client, checkpoint, **kwargs):
+    out = io.StringIO()
+    export(client, out, groups={"~test"}, workers=2, checkpoint=checkpoint, **kwargs)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_export_resume(tmp_path):
+    client = Client(tildes_client=FakeTildesClient(num_comments=3, num_topics=12), per_page=5)
+    path = str(tmp_path / "checkpoint.json")
+
+    records = run_export(client, Checkpoint(path), pages=2)
+    assert [r["type"] for r in records] == ["group"] + (["topic"] * 5 + ["thread"] * 5) * 2
+    assert records[0]["name"] == "~test"
+    assert len(records[-1]["comments"]) == 3
+    assert isinstance(records[1]["timestamp"], str)
+
+    # Picks up on the third page, which is the last one
+    records += run_export(client, Checkpoint(path))
+    topics = [r["id36"] for r in records if r["type"] == "topic"]
+    threads = [r["id36"] for r in records if r["type"] == "thread"]
+    assert topics == threads == [f"t{i:x}" for i in range(12)]
+    assert Checkpoint(path).get("~test")["done"]
+
+    assert run_export(client, Checkpoint(path)) == []
+
+
+class FailingClient(Client):
+    def get_topic(self, topic_id):
+        if topic_id == "t3":
+            raise ValueError("Topic not found")
+        return super().get_topic(topic_id)
+
+
+def test_export_records_failures(tmp_path):
+    client = FailingClient(tildes_client=FakeTildesClient(num_comments=3, num_topics=6), per_page=5)
+    path = str(tmp_path / "checkpoint.json")
+
+    records = run_export(client, Checkpoint(path))
+    threads = [r["id36"] for r in records if r["type"] == "thread"]
+    assert threads == ["t0", "t1", "t2", "t4", "t5"]
+    assert Checkpoint(path).failed == ["t3"]
+    assert Checkpoint(path).get("~test")["done"]
+
+
+def test_export_command_reports_failures(tmp_path, capsys):
+    client = FailingClient(tildes_client=FakeTildesClient(num_comments=3, num_topics=6), per_page=5)
+    args = Namespace(
+        group=["test"],
+        pages=None,
+        no_threads=False,
+        workers=2,
+        checkpoint=str(tmp_path / "checkpoint.json"),
+        quiet=True,
+    )
+    assert export_command.main(args, client) == 1
+    assert "Unable to export 1 threads: t3" in capsys.readouterr().err
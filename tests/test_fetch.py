@@ -0,0 +1,57 @@
+import threading
+
+from squiggly.fetch import Fetcher
+
+
+def test_fetcher_deduplicates_requests():
+    fetcher = Fetcher(max_workers=1)
+    release = threading.Event()
+    calls, results = [], []
+
+    def load(after):
+        calls.append(after)
+        release.wait(5)
+        return after
+
+    try:
+        first = fetcher.submit(load, "abc", key="more", callback=results.append)
+        second = fetcher.submit(load, "abc", key="more", callback=results.append)
+        assert first is second
+
+        release.set()
+        first.future.result(5)
+        fetcher.process_pending()
+        assert calls == ["abc"]
+        assert results == ["abc"]
+    finally:
+        fetcher.shutdown()
+
+
+def test_fetcher_shares_calls_across_keys():
+    fetcher = Fetcher(max_workers=1)
+    release = threading.Event()
+    calls, results = [], []
+
+    def load(after):
+        calls.append(after)
+        release.wait(5)
+        return after
+
+    try:
+        prefetch = fetcher.submit(load, "abc", key="prefetch", callback=results.append)
+        assert fetcher.in_flight(load, "abc")
+        assert not fetcher.in_flight(load, "def")
+        more = fetcher.submit(load, "abc", key="more", callback=results.append)
+        assert more.future is prefetch.future
+
+        # The call keeps running for the request that's still waiting on it
+        fetcher.cancel("prefetch")
+        release.set()
+        more.future.result(5)
+        fetcher.process_pending()
+        assert calls == ["abc"]
+        assert results == ["abc"]
+        assert not fetcher.busy
+        assert not fetcher.in_flight(load, "abc")
+    finally:
+        fetcher.shutdown()
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from squiggly.frontpage import FrontPage
+from squiggly.records import PartialTopic
+
+
+class ListingClient:
+    per_page = 3
+
+    def __init__(self, listings):
+        self.listings = listings
+        self.calls = []
+
+    def list_topics(self, group="", after="", order="", period=""):
+        self.calls.append((group, after))
+        topics = self.listings[group]
+        start = [topic.id36 for topic in topics].index(after) + 1 if after else 0
+        topics = topics[start : start + self.per_page]
+        return {"topics": topics, "last": topics[-1].id36 if topics else None}
+
+
+def make_topics(group, minutes):
+    start = datetime(2019, 5, 1)
+    return [
+        PartialTopic(
+            f"{group}{i}", group, "someone", "", None, "", 0, 0, start - timedelta(minutes=m)
+        )
+        for i, m in enumerate(minutes)
+    ]
+
+
+def test_front_page_merge():
+    client = ListingClient(
+        {
+            "~busy": make_topics("~busy", range(0, 20, 2)),
+            "~quiet": make_topics("~quiet", [3, 100]),
+        }
+    )
+    front_page = FrontPage(client, ["~busy", "~quiet"], per_page=4)
+
+    topics, after = [], ""
+    while True:
+        data = front_page.next_page(after)
+        if not data["topics"]:
+            break
+        topics.extend(data["topics"])
+        after = data["last"]
+
+    timestamps = [topic.timestamp for topic in topics]
+    assert len(topics) == 12
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    # The quiet group only ran out after the first page
+    assert [call for call in client.calls if call[0] == "~quiet"] == [
+        ("~quiet", ""),
+        ("~quiet", "~quiet1"),
+    ]
+
+
+def test_front_page_repeats_dropped_page():
+    client = ListingClient({"~busy": make_topics("~busy", range(10))})
+    front_page = FrontPage(client, ["~busy"], per_page=4)
+
+    first = front_page.next_page()
+    # The result for the second page never arrives, e.g. it was cancelled
+    second = front_page.next_page(first["last"])
+    assert front_page.next_page(first["last"]) == second
+
+    third = front_page.next_page(second["last"])
+    topics = first["topics"] + second["topics"] + third["topics"]
+    assert [topic.id36 for topic in topics] == [f"~busy{i}" for i in range(10)]
@@ -0,0 +1,40 @@
+from squiggly.history import ViewHistory
+
+
+class View:
+    def __init__(self, name, built_widgets=0):
+        self.name = name
+        self.built_widgets = built_widgets
+
+    def release(self):
+        self.built_widgets = 0
+
+
+def test_history_back_forward():
+    history = ViewHistory()
+    a, b, c = View("a"), View("b"), View("c")
+    history.push(a)
+    history.push(b)
+    assert history.back() is a
+    assert history.back() is None
+    assert history.forward() is b
+
+    # Opening another view drops b from the list but keeps it retained
+    history.back()
+    history.push(c)
+    assert history.entries == [a, c]
+    assert history.forward() is None
+    assert history.find(lambda view: view.name == "b") is b
+
+
+def test_history_limits():
+    history = ViewHistory(max_entries=3, widget_budget=100)
+    views = [View(str(i), built_widgets=60) for i in range(4)]
+    for view in views:
+        history.push(view)
+
+    assert history.find(lambda view: view is views[0]) is None
+    assert history.current is views[3]
+    assert sum(view.built_widgets for view in views) <= 100 + 60
+    assert views[3].built_widgets == 60
+    assert views[1].built_widgets == 0
@@ -0,0 +1,33 @@
+import json
+
+from squiggly.metrics import Histogram, Metrics
+
+
+def test_histogram():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.observe(0.001)
+    for _ in range(10):
+        histogram.observe(0.1)
+
+    assert histogram.count == 100
+    assert histogram.min == 0.001
+    assert histogram.max == 0.1
+    assert 0.001 <= histogram.percentile(50) < 0.002
+    assert 0.05 < histogram.percentile(95) <= 0.1
+
+
+def test_metrics_dump(tmp_path):
+    metrics = Metrics()
+    metrics.incr("cache.hit")
+    metrics.incr("cache.hit", 2)
+    with metrics.timer("fetch"):
+        pass
+
+    path = tmp_path / "metrics.json"
+    metrics.dump(str(path), extra=True)
+    data = json.loads(path.read_text())
+    assert data["counters"] == {"cache.hit": 3}
+    assert data["histograms"]["fetch"]["count"] == 1
+    assert data["extra"] is True
+    assert "fetch" in metrics.format()
@@ -0,0 +1,22 @@
+import json
+
+from benchmarks.fixtures import FakeTildesClient
+from squiggly.api import Client
+from squiggly.replay import RecordingClient, ReplayClient, Session, parse_script, summarize
+
+
+def test_record_and_replay(tmp_path):
+    keys = parse_script("enter, down*20, up, enter, page down*3")
+    assert len(keys) == 26
+
+    recorder = RecordingClient(Client(tildes_client=FakeTildesClient(num_topics=10), per_page=10))
+    recorded = Session(recorder, (80, 24)).run(keys)
+    path = tmp_path / "fixtures.json"
+    recorder.save(str(path))
+
+    client = ReplayClient(json.loads(path.read_text()))
+    frames = Session(client, (80, 24)).run(keys)
+    assert [frame["view"] for frame in frames] == [frame["view"] for frame in recorded]
+    assert frames[-1]["view"] == "CommentListBox"
+    assert frames[-1]["canvas"] == [80, 24]
+    assert summarize(frames)["down"]["count"] == 20
@@ -0,0 +1,54 @@
+from squiggly.records import Comment, PartialTopic, Topic
+from squiggly.search import SearchIndex, build_query
+
+
+def make_topic(id36, title, comments):
+    return Topic(
+        id36, "test", "author", title, None, "", len(comments), 0, None, False, [], comments
+    )
+
+
+def test_build_query():
+    assert build_query("") is None
+    assert build_query('foo "bar') == '"foo" "bar"*'
+    assert build_query("foo bar ") == '"foo" "bar"'
+    assert build_query("foo b") == '"foo" "b"'
+
+
+def test_search_index():
+    index = SearchIndex()
+    comments = [
+        Comment("c1", None, 0, "alice", "<p>I like <em>sourdough</em> bread</p>", "NORMAL", None),
+        Comment("c2", "c1", 1, "bob", "Rye is better", "NORMAL", None),
+    ]
+    index.add_topic(make_topic("t1", "Baking bread", comments))
+    index.add_topics([PartialTopic("t2", "test", "carol", "Bread machines", None, "", 0, 0, None)])
+
+    results = index.search("bread")
+    assert [(r.topic_id, r.comment_id) for r in results][:2] == [("t1", None), ("t2", None)]
+    assert ("t1", "c1") in [(r.topic_id, r.comment_id) for r in results]
+
+    (result,) = index.search("sourd")
+    assert result.comment_id == "c1"
+    assert result.title == "Baking bread"
+    assert "<" not in result.snippet
+
+    # Indexing the same topic again replaces the old rows
+    comments[1] = comments[1]._replace(content="Pumpernickel")
+    index.add_topic(make_topic("t1", "Baking bread", comments))
+    assert len(index) == 4
+    assert index.search("rye") == []
+    assert index.search("pumpernickel")[0].comment_id == "c2"
+
+
+def test_search_index_later(tmp_path):
+    path = str(tmp_path / "search.sqlite3")
+    index = SearchIndex(path)
+    comment = Comment("c1", None, 0, "alice", "Sourdough", "NORMAL", None)
+    index.add_topic_later(make_topic("t1", "Baking bread", [comment]))
+    # Closing the index waits for the queued topics to be written
+    index.close()
+
+    index = SearchIndex(path)
+    assert index.search("sourdough")[0].comment_id == "c1"
+    index.close()
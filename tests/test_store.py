@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.fixtures import FakeTildesClient
+from squiggly.api import Client
+from squiggly.records import Group, PartialTopic
+from squiggly.store import OfflineClient, SnapshotStore, sync
+
+
+def make_topics(group, minutes):
+    start = datetime(2019, 5, 1, tzinfo=timezone.utc)
+    return [
+        PartialTopic(
+            f"{group}{i}", group, "someone", "", None, "", 0, 0, start - timedelta(minutes=m)
+        )
+        for i, m in enumerate(minutes)
+    ]
+
+
+def test_snapshot_pagination(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshot.sqlite3"))
+    # Topics with the same timestamp are ordered by id36, and mustn't be
+    # skipped or repeated when a page ends between them
+    store.save_topics("~a", make_topics("~a", [0, 1, 1, 1, 2, 3, 4]))
+    store.save_topics("~b", make_topics("~b", [0, 5]))
+
+    pages, after = [], ""
+    while True:
+        topics = store.load_topics("~a", after, limit=2)
+        if not topics:
+            break
+        pages.append([topic.id36 for topic in topics])
+        after = topics[-1].id36
+    assert pages == [["~a0", "~a3"], ["~a2", "~a1"], ["~a4", "~a5"], ["~a6"]]
+    store.close()
+
+
+def test_offline_client(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshot.sqlite3"))
+    store.save_groups([Group("~a", "", 1, True)])
+    store.save_topics("~a", make_topics("~a", [0, 1, 2]))
+    client = OfflineClient(store, per_page=2)
+
+    assert [group.name for group in client.list_groups()["groups"]] == ["~a"]
+    assert client.get_cached("list_groups") == client.list_groups()
+
+    data = client.list_topics("~a")
+    assert [topic.id36 for topic in data["topics"]] == ["~a0", "~a1"]
+    data = client.list_topics("~a", data["last"])
+    assert [topic.id36 for topic in data["topics"]] == ["~a2"]
+    assert client.list_topics("~a", data["last"])["last"] is None
+
+    # Threads that weren't synced can't be opened
+    with pytest.raises(LookupError):
+        client.get_topic("~a0")
+    store.close()
+
+
+def test_sync(tmp_path):
+    fake = FakeTildesClient(num_comments=3, num_topics=12, groups=("test",))
+    client = Client(tildes_client=fake, per_page=5)
+    store = SnapshotStore(str(tmp_path / "snapshot.sqlite3"))
+    messages = []
+    sync(client, store, pages=2, workers=2, progress=messages.append)
+    assert messages == ["Synced 10 topics from ~test"]
+
+    offline = OfflineClient(store, per_page=5)
+    assert [group.name for group in offline.list_groups()["groups"]] == ["~test"]
+    data = offline.list_topics("~test", "t4")
+    assert [topic.id36 for topic in data["topics"]] == [f"t{i:x}" for i in range(5, 10)]
+    assert offline.list_topics("~test", "t9")["topics"] == []
+
+    topic = offline.get_topic("t3")
+    assert len(topic.comments) == 3
+    assert list(offline.iter_topic("t3")) == [topic._replace(comments=[])] + topic.comments
+    store.close()
+
+
+class FailingClient(Client):
+    def get_topic(self, topic_id):
+        if topic_id == "t1":
+            raise ValueError("Topic not found")
+        return super().get_topic(topic_id)
+
+
+def test_sync_skips_failed_threads(tmp_path):
+    fake = FakeTildesClient(num_comments=3, num_topics=3, groups=("test",))
+    store = SnapshotStore(str(tmp_path / "snapshot.sqlite3"))
+    sync(FailingClient(tildes_client=fake, per_page=5), store)
+
+    offline = OfflineClient(store)
+    assert [topic.id36 for topic in offline.list_topics("~test")["topics"]] == ["t0", "t1", "t2"]
+    assert offline.get_topic("t2").id36 == "t2"
+    with pytest.raises(LookupError):
+        offline.get_topic("t1")
+    store.close()
@@ -0,0 +1,99 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from squiggly.transport import NotModified, TokenBucket, Transport
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.failures:
+            self.server.failures -= 1
+            self.respond(503, b"busy")
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self.respond(304, b"")
+        else:
+            self.respond(200, b"hello", {"ETag": '"v1"'})
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport():
+    transport = Transport(rate=1000, burst=1000, backoff=0.01)
+    yield transport
+    transport.close()
+
+
+def url(server, path="/topic"):
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+def test_conditional_request(server, transport):
+    assert transport.get(url(server)).text == "hello"
+
+    # Unconditional requests always return the full page
+    assert transport.get(url(server)).status_code == 200
+
+    with pytest.raises(NotModified):
+        with transport.conditional():
+            transport.get(url(server))
+    assert transport.not_modified == 1
+
+
+def test_retry_with_backoff(server, transport):
+    server.failures = 2
+    response = transport.get(url(server))
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+    assert transport.retried == 2
+    assert transport.bucket.rate < 1000
+
+
+def test_retry_gives_up(server, transport):
+    server.failures = 10
+    response = transport.get(url(server))
+    assert response.status_code == 503
+    assert len(server.requests) == transport.retries + 1
+
+
+def test_connection_reuse(server, transport):
+    for _ in range(5):
+        transport.get(url(server))
+    assert transport.stats()["connections"] == 1
+
+
+def test_token_bucket_adapts():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() > 0
+
+    bucket.slow_down()
+    assert bucket.rate == 5
+    bucket.speed_up()
+    assert bucket.rate == 6
@@ -0,0 +1,42 @@
+from squiggly.records import Comment
+from squiggly.tree import CommentTree
+
+
+def make_comments(levels):
+    return [
+        Comment(f"c{i}", None, level, "someone", "", "NORMAL", None)
+        for i, level in enumerate(levels)
+    ]
+
+
+def test_comment_tree():
+    # c0
+    #   c1
+    #     c2
+    #   c3
+    # c4
+    tree = CommentTree(make_comments([0, 1, 2, 1, 0]))
+    assert tree.position("c3") == 3
+    assert tree.position("c9") is None
+    assert [tree.parent(i) for i in range(5)] == [None, 0, 1, 0, None]
+    assert [tree.end(i) for i in range(5)] == [4, 3, 3, 4, 5]
+    assert tree.descendants(0) == 3
+    assert tree.descendants(4) == 0
+
+    assert tree.next_sibling(0) == 4
+    assert tree.next_sibling(1) == 3
+    assert tree.next_sibling(3) is None
+    assert tree.prev_sibling(4) == 0
+    assert tree.prev_sibling(3) == 1
+    assert tree.prev_sibling(1) is None
+
+
+def test_comment_tree_extend():
+    comments = make_comments([0, 1, 2, 1, 0])
+    tree = CommentTree(comments[:2])
+    # The subtree of c0 is still open, so it ends with the list for now
+    assert tree.end(0) == 2
+
+    tree.extend(comments[2:])
+    assert [tree.end(i) for i in range(5)] == [4, 3, 3, 4, 5]
+    assert tree.next_sibling(0) == 4
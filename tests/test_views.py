@@ -0,0 +1,67 @@
+from squiggly.records import Comment, Topic
+from squiggly.views import CommentListBox
+
+
+def make_comment(id36, level, content=""):
+    return Comment(id36, None, level, "someone", content, "NORMAL", None)
+
+
+def make_topic(comments):
+    return Topic(
+        "t1", "test", "author", "Title", None, "", len(comments), 0, None, False, [], comments
+    )
+
+
+def test_comment_navigation():
+    comments = [make_comment(f"c{i}", level) for i, level in enumerate([0, 1, 2, 1, 0])]
+    listbox = CommentListBox(make_topic(comments))
+    size = (80, 20)
+    listbox.render(size, focus=True)
+
+    listbox.keypress(size, "n")
+    assert listbox.walker.focus == 4
+    listbox.keypress(size, "N")
+    assert listbox.walker.focus == 0
+
+    # Collapsing c0 hides its replies, so moving down skips straight to c4
+    listbox.keypress(size, " ")
+    assert list(listbox.walker.positions()) == [0, 4]
+    listbox.keypress(size, "down")
+    assert listbox.walker.focus == 4
+
+    listbox.keypress(size, " ")
+    listbox.focus_comment("c2")
+    listbox.keypress(size, "p")
+    assert listbox.walker.focus == 1
+
+
+def test_comment_refresh():
+    comments = [make_comment("c0", 0), make_comment("c1", 1), make_comment("c2", 0)]
+    comments.append(make_comment("c3", 1))
+    listbox = CommentListBox(make_topic(comments))
+    walker = listbox.walker
+    unchanged = walker[0]
+    walker.toggle_collapsed(2)
+    listbox.focus_comment("c2")
+
+    # c0 gets a new reply, c1 is edited and c3 gets a reply of its own
+    new_comments = [
+        comments[0],
+        make_comment("new1", 1),
+        comments[1]._replace(content="edited"),
+        comments[2],
+        comments[3],
+        make_comment("new2", 2),
+    ]
+    assert listbox.refresh(make_topic(new_comments)) == 3
+    assert listbox.data.comments == new_comments
+
+    # Widgets of unchanged comments are kept, edited ones are rebuilt
+    assert walker[0] is unchanged
+    assert walker[2].data.content == "edited"
+
+    # c2 stays collapsed and focused at its new position
+    assert walker.collapsed == {3}
+    assert walker.focus == 3
+    assert list(walker.positions()) == [0, 1, 2, 3]
+    assert "[+2 hidden]" in walker[3].render((80,)).text[-1].decode()
@@ -0,0 +1,16 @@
+import urwid
+
+from squiggly.widgets import BoxShadow
+
+
+def test_box_shadow():
+    shadow = BoxShadow(urwid.Text("hello\nworld"))
+    assert shadow.rows((8,)) == 3
+    assert [row.decode() for row in shadow.render((8,)).text] == [
+        "hello  ▖",
+        "world  ▌",
+        "▝▀▀▀▀▀▀▘",
+    ]
+
+    shadow = BoxShadow(urwid.SolidFill("x"))
+    assert shadow.render((6, 4)).text[-1].decode() == "▝▀▀▀▀▘"